@@ -21,4 +21,12 @@ if [ -f "data/ingredients.json" ]; then
 fi
 
 cd foodgram
-gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
+# SERVER_MODE=asgi включает асинхронные представления для частых
+# запросов чтения; рецепты отдаются асинхронно только из кэша ответов,
+# остальное выполняется синхронным DRF в пуле потоков
+# (см. SERVER_MODE в foodgram/settings.py)
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+else
+    gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
+fi
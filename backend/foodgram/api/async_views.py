@@ -0,0 +1,221 @@
+"""Асинхронные представления для часто читаемых адресов API.
+
+Используются при запуске через ASGI (см. foodgram.asgi_urls).
+Представления обрабатывают самые частые запросы без занятия
+потока на всё время запроса: поиск ингредиентов, страницы
+пользователей и рецепты из кэша ответов. Все остальные запросы,
+в том числе запись, ошибки аутентификации и промахи кэша,
+передаются синхронным представлениям DRF, поэтому ответы совпадают
+с режимом WSGI. Потоковые ответы синхронных представлений отдаются
+по частям благодаря foodgram.middleware.AsyncStreamingMiddleware.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse, HttpResponseNotFound
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.ingredient_index import ingredient_index
+from users.models import Subscription, User
+from .authentication import token_cache
+from .counts import get_count
+from .ingredient_catalogue import ingredient_catalogue
+from .pagination import CustomPagination
+from .recipe_cache import recipe_response_cache
+from .renderers import FastJSONRenderer
+from .serializers import UserSerializer
+from .views import SYNC_URLCONF
+
+
+def csrf_exempt(view):
+    """Отключает проверку CSRF для асинхронного представления.
+
+    Как и представления DRF, асинхронные представления не используют
+    сессии; декоратор Django 4.2 не поддерживает корутины.
+    """
+    view.csrf_exempt = True
+    return view
+
+
+def get_sync_view(request):
+    """Возвращает синхронное представление и его аргументы."""
+    return resolve(request.path_info, urlconf=SYNC_URLCONF)
+
+
+async def delegate(request):
+    """Передаёт запрос синхронному представлению DRF."""
+    try:
+        match = get_sync_view(request)
+    except Resolver404:
+        return HttpResponseNotFound()
+    return await sync_to_async(match.func)(
+        request, *match.args, **match.kwargs
+    )
+
+
+def get_allowed_methods(request):
+    """Возвращает заголовок Allow так же, как вьюсет DRF."""
+    view = get_sync_view(request).func
+    methods = set(view.actions) | {'options'}
+    if 'get' in methods:
+        methods.add('head')
+    return ', '.join(
+        method.upper() for method in view.cls.http_method_names
+        if method in methods
+    )
+
+
+def accepts_json(request):
+    """Проверяет, что клиент ожидает JSON, а не HTML-страницу
+    браузерного API или другой формат."""
+    return (
+        request.method in ('GET', 'HEAD')
+        and api_settings.URL_FORMAT_OVERRIDE not in request.GET
+        and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+async def authenticate(request):
+    """Определяет пользователя по токену.
+
+    Возвращает None, если заголовок нестандартный или токен неверен:
+    такие запросы обрабатывает синхронное представление.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if not header:
+        return AnonymousUser()
+    if len(header) != 2 or header[0].lower() != 'token':
+        return None
+    token = token_cache.get(header[1])
+    if token is not None:
+        user = await User.objects.filter(pk=token.user_id).afirst()
+        return user if user is not None and user.is_active else None
+    token = await Token.objects.select_related('user').filter(
+        key=header[1]
+    ).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    token_cache.set(token)
+    return token.user
+
+
+def set_headers(request, response):
+    """Добавляет заголовки, которые проставляет представление DRF."""
+    response['Allow'] = get_allowed_methods(request)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def json_response(request, data):
+    """Возвращает ответ JSON с заголовками ответа DRF."""
+    return set_headers(request, HttpResponse(
+        FastJSONRenderer().render(data), content_type='application/json'
+    ))
+
+
+async def prepare(request):
+    """Проверяет, что запрос можно обработать асинхронно,
+    и аутентифицирует пользователя."""
+    if not accepts_json(request):
+        return False
+    user = await authenticate(request)
+    if user is None:
+        return False
+    request.user = user
+    return True
+
+
+@csrf_exempt
+async def ingredient_list(request):
+    """Поиск ингредиентов по началу названия."""
+    if not await prepare(request):
+        return await delegate(request)
+    name = request.GET.get('name')
+    if name is None:
+        return set_headers(request, await sync_to_async(
+            ingredient_catalogue.get_response
+        )(request))
+    items = await sync_to_async(ingredient_index.search)(name)
+    return json_response(request, items)
+
+
+async def get_cached_recipes(request, recipe_id=None):
+    """Возвращает ответ из кэша рецептов или ответ синхронного
+    представления при промахе."""
+    if (not await prepare(request)
+            or not recipe_response_cache.is_cacheable(request)):
+        return await delegate(request)
+    key = await recipe_response_cache.aget_key(request, recipe_id)
+    data = await recipe_response_cache.aget(request, key)
+    if data is None:
+        return await delegate(request)
+    return json_response(request, data)
+
+
+@csrf_exempt
+async def recipe_list(request):
+    """Список рецептов."""
+    return await get_cached_recipes(request)
+
+
+@csrf_exempt
+async def recipe_detail(request, pk):
+    """Рецепт."""
+    return await get_cached_recipes(request, str(pk))
+
+
+def get_page_number(request, count, page_size):
+    """Возвращает номер страницы или None, если номер задан
+    не числом или вне диапазона."""
+    page = request.GET.get(CustomPagination.page_query_param, '1')
+    if not page.isdigit():
+        return None
+    pages = max(1, -(-count // page_size))
+    page = int(page)
+    return page if 1 <= page <= pages else None
+
+
+def get_page_link(request, number, count, page_size):
+    """Возвращает ссылку на страницу так же, как PageNumberPagination."""
+    pages = max(1, -(-count // page_size))
+    if not 1 <= number <= pages:
+        return None
+    url = request.build_absolute_uri()
+    param = CustomPagination.page_query_param
+    if number == 1:
+        return remove_query_param(url, param)
+    return replace_query_param(url, param, number)
+
+
+@csrf_exempt
+async def user_list(request):
+    """Список пользователей."""
+    if not await prepare(request):
+        return await delegate(request)
+    users = User.objects.all()
+    if request.user.is_authenticated:
+        users = users.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                user=request.user, author=OuterRef('pk')
+            )
+        ))
+    page_size = CustomPagination().get_page_size(Request(request))
+    count = await sync_to_async(get_count)(users)
+    number = get_page_number(request, count, page_size)
+    if number is None:
+        return await delegate(request)
+    offset = (number - 1) * page_size
+    page = [user async for user in users[offset:offset + page_size]]
+    return json_response(request, {
+        'count': count,
+        'next': get_page_link(request, number + 1, count, page_size),
+        'previous': get_page_link(request, number - 1, count, page_size),
+        'results': UserSerializer(
+            page, many=True, context={'request': request}
+        ).data,
+    })
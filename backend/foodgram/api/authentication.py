@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+from .cache import LRUCache
+
+
+class TokenCache:
+    """Кэш токенов в памяти процесса.
+
+    Хранятся только ключ токена, id пользователя и дата создания:
+    сам пользователь загружается заново при каждом запросе, чтобы
+    представления не сохраняли устаревшие данные пользователя.
+    Записи живут не дольше TOKEN_CACHE_TIMEOUT секунд и сбрасываются
+    при удалении токена в этом процессе; в остальных процессах
+    удаление токена вступает в силу по истечении срока жизни записи.
+    """
+
+    def __init__(self, max_size, timeout):
+        self._tokens = LRUCache(max_size, timeout=timeout)
+
+    def get(self, key):
+        """Возвращает токен без пользователя или None."""
+        cached = self._tokens.get(key)
+        if cached is None:
+            return None
+        user_id, created = cached
+        return Token(key=key, user_id=user_id, created=created)
+
+    def set(self, token):
+        """Сохраняет токен."""
+        self._tokens.set(token.key, (token.user_id, token.created))
+
+    def delete(self, key):
+        """Сбрасывает запись токена."""
+        self._tokens.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием токена.
+
+    При попадании в кэш вместо соединения таблиц токенов
+    и пользователей выполняется выборка пользователя по первичному
+    ключу; неверные токены по-прежнему проверяются базой данных,
+    а активность пользователя проверяется при каждом запросе.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token)
+            return user, token
+        user = User.objects.filter(pk=token.user_id).first()
+        if user is None or not user.is_active:
+            token_cache.delete(key)
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        token.user = user
+        return user, token
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_SIZE,
+    timeout=settings.TOKEN_CACHE_TIMEOUT
+)
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import cache
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса.
+
+    Размер записи определяется функцией get_size (по умолчанию
+    каждая запись занимает единицу). При превышении max_size
+    вытесняются давно не использованные записи. Если задан timeout,
+    записи устаревают через указанное число секунд.
+    """
+
+    def __init__(self, max_size, get_size=None, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._get_size = get_size or (lambda value: 1)
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу и отмечает его использование."""
+        with self._lock:
+            try:
+                value, size, expires = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires <= monotonic():
+                del self._data[key]
+                self._size -= size
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя старые записи при переполнении."""
+        size = self._get_size(value)
+        if size > self.max_size:
+            return
+        expires = None
+        if self.timeout is not None:
+            expires = monotonic() + self.timeout
+        with self._lock:
+            if key in self._data:
+                self._size -= self._data.pop(key)[1]
+            self._data[key] = (value, size, expires)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._size -= evicted_size
+
+    def delete(self, key):
+        """Удаляет значение по ключу."""
+        with self._lock:
+            if key in self._data:
+                self._size -= self._data.pop(key)[1]
+
+    def clear(self):
+        """Очищает кэш."""
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+class DjangoCache:
+    """Обёртка над кэшем Django с интерфейсом LRUCache.
+
+    Позволяет хранить данные в общем для всех процессов кэше,
+    настроенном в CACHES; max_size при этом не используется.
+    """
+
+    def __init__(self, max_size=None, get_size=None, timeout=None):
+        self.timeout = timeout
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу."""
+        return cache.get(key, default)
+
+    def set(self, key, value):
+        """Сохраняет значение."""
+        cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        """Удаляет значение по ключу."""
+        cache.delete(key)
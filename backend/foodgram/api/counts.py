@@ -0,0 +1,98 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+VERSION_KEY = 'count-version:{}'
+COUNT_KEY = 'count:{}:{}'
+
+
+def get_tables(queryset):
+    """Возвращает таблицы, участвующие в запросе."""
+    return sorted({
+        alias.table_name for alias in queryset.query.alias_map.values()
+    } | {queryset.model._meta.db_table})
+
+
+def bump_version(table):
+    """Сбрасывает закэшированные количества для запросов,
+    затрагивающих таблицу, после фиксации транзакции.
+
+    Если увеличить версию до фиксации, параллельный запрос может
+    закэшировать ещё старое количество под новой версией.
+    """
+    key = VERSION_KEY.format(table)
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def get_signature(queryset, tables):
+    """Возвращает ключ кэша для количества строк запроса.
+
+    Ключ включает текст запроса с параметрами фильтрации и версии
+    всех затронутых таблиц.
+    """
+    sql, params = queryset.query.sql_with_params()
+    versions = cache.get_many([VERSION_KEY.format(table) for table in tables])
+    digest = hashlib.sha256(repr((
+        sql, params,
+        [versions.get(VERSION_KEY.format(table), 0) for table in tables]
+    )).encode()).hexdigest()
+    return COUNT_KEY.format(queryset.model._meta.label_lower, digest)
+
+
+def get_estimate(queryset):
+    """Возвращает оценку числа строк таблицы по статистике
+    планировщика PostgreSQL или None, если оценка недоступна."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def is_unfiltered(queryset):
+    """Проверяет, что запрос выбирает всю таблицу целиком."""
+    query = queryset.query
+    return (
+        not query.where
+        and not query.distinct
+        and len(query.alias_map) <= 1
+        and query.low_mark == 0
+        and query.high_mark is None
+    )
+
+
+def get_count(queryset):
+    """Возвращает количество строк запроса.
+
+    Для больших таблиц без фильтров используется оценка
+    планировщика, в остальных случаях — точное количество,
+    закэшированное на PAGINATION_COUNT_CACHE_TIMEOUT секунд до
+    изменения любой из затронутых таблиц.
+    """
+    if not hasattr(queryset, 'query'):
+        return len(queryset)
+    if is_unfiltered(queryset):
+        estimate = get_estimate(queryset)
+        if (estimate is not None
+                and estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD):
+            return estimate
+    key = get_signature(queryset, get_tables(queryset))
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from rest_framework import serializers
+
+
+class HybridImageField(Base64ImageField):
+    """Поле изображения, принимающее как строку base64, так и файл
+    из multipart-запроса.
+
+    Размер проверяется до декодирования изображения: для base64 — по
+    длине строки, для файла — по размеру, уже сохранённому
+    загрузчиком Django во временный файл.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.max_size = kwargs.pop(
+            'max_size', settings.IMAGE_UPLOAD_MAX_SIZE
+        )
+        super().__init__(*args, **kwargs)
+
+    def check_size(self, size):
+        """Проверяет, что размер файла не превышает допустимый."""
+        if size > self.max_size:
+            raise serializers.ValidationError(
+                'Размер файла не должен превышать '
+                f'{filesizeformat(self.max_size)}'
+            )
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if isinstance(data, str):
+            payload = data.partition(';base64,')[2] or data
+            self.check_size(len(payload) * 3 // 4)
+            return super().to_internal_value(data)
+        self.check_size(getattr(data, 'size', 0))
+        # Файл передаётся обычному ImageField в обход разбора base64
+        return super(Base64FieldMixin, self).to_internal_value(data)
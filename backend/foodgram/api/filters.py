@@ -8,7 +8,7 @@ class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(
         field_name='name',
         # lookup_expr='icontains'
-        lookup_expr='startswith'
+        lookup_expr='istartswith'
     )
 
     class Meta:
@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+from collections import namedtuple
+from threading import Lock
+
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from rest_framework import status
+
+from recipes.ingredient_index import ingredient_index
+from .renderers import FastJSONRenderer
+
+CatalogueContent = namedtuple(
+    'CatalogueContent', ('body', 'gzip_body', 'etag', 'gzip_etag')
+)
+
+
+def accepts_gzip(accept_encoding):
+    """Проверяет, что клиент принимает gzip, с учётом весов q
+    в заголовке Accept-Encoding."""
+    weights = {}
+    for coding in accept_encoding.split(','):
+        name, *params = coding.split(';')
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+class IngredientCatalogue:
+    """Заранее отрендеренный JSON полного списка ингредиентов.
+
+    Хранит тело ответа, его сжатую gzip версию и ETag по хешу
+    содержимого. Пересобирается при изменении версии индекса
+    ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._content = None
+
+    def _build(self):
+        """Рендерит список ингредиентов."""
+        body = FastJSONRenderer().render(ingredient_index.all())
+        digest = hashlib.sha256(body).hexdigest()
+        return CatalogueContent(
+            body=body,
+            gzip_body=gzip.compress(body, mtime=0),
+            etag=f'"{digest}"',
+            gzip_etag=f'"{digest}-gz"'
+        )
+
+    def get(self):
+        """Возвращает актуальное содержимое каталога."""
+        version = ingredient_index.version
+        content = self._content
+        if content is None or self._version != version:
+            with self._lock:
+                if self._content is None or self._version != version:
+                    self._content = self._build()
+                    self._version = version
+                content = self._content
+        return content
+
+    def get_response(self, request):
+        """Возвращает ответ с полным списком ингредиентов.
+
+        Отдаёт заранее отрендеренное тело ответа, при поддержке
+        клиентом — сжатое gzip со своим ETag, и отвечает 304
+        на If-None-Match с актуальным ETag выбранного варианта.
+        """
+        content = self.get()
+        use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        etag = content.gzip_etag if use_gzip else content.etag
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (
+            if_none_match.strip() == '*'
+            or etag in parse_etags(if_none_match)
+        ):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif use_gzip:
+            response = HttpResponse(
+                content.gzip_body, content_type='application/json'
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                content.body, content_type='application/json'
+            )
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+ingredient_catalogue = IngredientCatalogue()
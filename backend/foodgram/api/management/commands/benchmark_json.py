@@ -0,0 +1,140 @@
+from io import BytesIO
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from recipes.ingredient_index import ingredient_index
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+
+
+def make_recipe(number):
+    """Возвращает рецепт в том виде, в каком его отдаёт API."""
+    url = f'https://foodgram.example/media/recipes/images/{number:064x}'
+    return {
+        'id': number,
+        'author': {
+            'id': number % 50,
+            'email': f'author{number % 50}@foodgram.example',
+            'username': f'author{number % 50}',
+            'first_name': 'Анна',
+            'last_name': 'Иванова',
+            'is_subscribed': number % 3 == 0,
+            'avatar': None,
+        },
+        'ingredients': [
+            {
+                'id': number * 10 + index,
+                'name': f'Ингредиент {number * 10 + index}',
+                'measurement_unit': 'г',
+                'amount': index * 25 + 5,
+            }
+            for index in range(8)
+        ],
+        'is_favorited': number % 2 == 0,
+        'is_in_shopping_cart': False,
+        'name': f'Рецепт {number}',
+        'image': f'{url}.png',
+        'image_variants': {
+            size: {
+                'webp': f'{url}_{size}.webp',
+                'jpeg': f'{url}_{size}.jpeg',
+            }
+            for size in ('thumbnail', 'card', 'detail')
+        },
+        'text': 'Смешать все ингредиенты и запекать до готовности. ' * 10,
+        'cooking_time': number % 120 + 5,
+    }
+
+
+def make_catalogue(size):
+    """Возвращает список ингредиентов в том виде, в каком его
+    отдаёт API."""
+    return [
+        {
+            'id': number,
+            'name': f'Ингредиент {number}',
+            'measurement_unit': 'г',
+        }
+        for number in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    """Команда для сравнения скорости рендеринга и разбора JSON."""
+    help = (
+        'Замеряет время рендеринга и разбора типичных ответов API '
+        'рендерером DRF и FastJSONRenderer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[6, 100, 1000],
+            help='Количество рецептов на странице'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов для каждого замера'
+        )
+
+    def measure(self, function, repeat):
+        """Возвращает минимальное время выполнения функции в мс."""
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            function()
+            timings.append(perf_counter() - started)
+        return min(timings) * 1000
+
+    def get_payloads(self, sizes):
+        """Возвращает данные для замеров."""
+        payloads = {
+            f'{size} рецептов': {
+                'count': size,
+                'next': None,
+                'previous': None,
+                'results': [make_recipe(number) for number in range(size)],
+            }
+            for size in sizes
+        }
+        catalogue = ingredient_index.all() or make_catalogue(2000)
+        payloads[f'Каталог, {len(catalogue)} ингредиентов'] = catalogue
+        return payloads
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, используется стандартный json'
+            ))
+        repeat = options['repeat']
+        renderers = (JSONRenderer(), FastJSONRenderer())
+        parsers = (JSONParser(), FastJSONParser())
+        for name, data in self.get_payloads(options['sizes']).items():
+            bodies = [renderer.render(data) for renderer in renderers]
+            if bodies[0] != bodies[1]:
+                raise CommandError(
+                    f'{name}: результаты рендеринга различаются'
+                )
+            render_times = [
+                self.measure(lambda: renderer.render(data), repeat)
+                for renderer in renderers
+            ]
+            parse_times = [
+                self.measure(
+                    lambda: parser.parse(BytesIO(bodies[0])), repeat
+                )
+                for parser in parsers
+            ]
+            self.stdout.write(
+                f'{name} ({len(bodies[0]) / 1024:.0f} КБ): '
+                f'рендеринг {render_times[0]:.2f} -> '
+                f'{render_times[1]:.2f} мс, '
+                f'разбор {parse_times[0]:.2f} -> {parse_times[1]:.2f} мс'
+            )
@@ -0,0 +1,47 @@
+from io import BytesIO
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from api.shopping_list_pdf import ShoppingListPDFRenderer
+
+
+class Command(BaseCommand):
+    """Команда для замера скорости рендера списка покупок в PDF."""
+    help = 'Замеряет время рендера списка покупок в PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 1000, 10000],
+            help='Количество строк в списке покупок'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов для каждого размера'
+        )
+
+    def handle(self, *args, **options):
+        renderer = ShoppingListPDFRenderer()
+        renderer.register_font()
+        for size in options['sizes']:
+            ingredients = [
+                (f'Ингредиент {number}', 'г', number % 1000 + 1)
+                for number in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                output = BytesIO()
+                started = perf_counter()
+                renderer.render(ingredients, output)
+                timings.append(perf_counter() - started)
+            self.stdout.write(
+                f'{size:>6} строк: '
+                f'мин {min(timings) * 1000:.1f} мс, '
+                f'среднее {sum(timings) / len(timings) * 1000:.1f} мс, '
+                f'{output.tell() / 1024:.0f} КБ'
+            )
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+from api.shopping_list import get_shopping_list_queryset
+
+# Признаки полного просмотра таблицы в планах PostgreSQL и SQLite
+SEQ_SCAN_MARKERS = ('Seq Scan', 'SCAN ')
+
+
+class Command(BaseCommand):
+    """Команда для проверки планов основных запросов API."""
+    help = (
+        'Выполняет EXPLAIN для основных запросов API и отмечает '
+        'последовательные сканирования таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email пользователя, от имени которого строятся запросы'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Завершиться с ошибкой при найденных сканированиях'
+        )
+
+    def get_queries(self, user):
+        """Возвращает проверяемые запросы."""
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        recipes = Recipe.objects.with_user_flags(user)
+        return {
+            'Список рецептов': recipes[:page_size],
+            'Избранные рецепты': recipes.filter(
+                in_favorites__user=user
+            )[:page_size],
+            'Рецепты в списке покупок': recipes.filter(
+                in_shopping_cart__user=user
+            )[:page_size],
+            'Поиск ингредиентов': Ingredient.objects.filter(
+                name__istartswith='мо'
+            ),
+            'Список покупок': get_shopping_list_queryset(user),
+            'Подписки': User.objects.filter(
+                subscription__user=user
+            )[:page_size],
+        }
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, заполните базу данных'
+            )
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                'Планы запросов рассчитаны на PostgreSQL: индекс '
+                'поиска ингредиентов без учёта регистра создаётся '
+                'только в нём'
+            ))
+        seq_scans = 0
+        for title, queryset in self.get_queries(user).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for line in queryset.explain().splitlines():
+                if any(marker in line for marker in SEQ_SCAN_MARKERS):
+                    seq_scans += 1
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        if seq_scans and options['strict']:
+            raise CommandError(
+                f'Найдено последовательных сканирований: {seq_scans}'
+            )
+        self.stdout.write(
+            f'Найдено последовательных сканирований: {seq_scans}'
+        )
@@ -0,0 +1,208 @@
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from threading import Event, Thread
+from time import perf_counter, sleep
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = [
+    '/api/ingredients/?name=%D1%81%D0%BE',
+    '/api/recipes/',
+    '/api/users/',
+]
+# Размер приёмного буфера сокета медленного клиента: маленький буфер
+# не даёт ядру принять весь ответ за клиента
+SLOW_CLIENT_BUFFER = 4096
+# Размер части ответа, которую медленный клиент читает за раз
+SLOW_CLIENT_CHUNK = 1024
+# Размер части запроса, которую медленный клиент отправляет за раз
+SLOW_CLIENT_SEND_CHUNK = 16
+
+
+class Command(BaseCommand):
+    """Команда нагрузочного тестирования запущенного сервера."""
+    help = (
+        'Отправляет параллельные GET-запросы к адресам API и выводит '
+        'пропускную способность и задержки; позволяет сравнить '
+        'развёртывания в режимах wsgi и asgi, в том числе при '
+        'медленных клиентах, которые долго читают ответы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            type=str,
+            nargs='+',
+            default=['http://localhost:8000'],
+            help='Адреса сравниваемых развёртываний'
+        )
+        parser.add_argument(
+            '--paths',
+            type=str,
+            nargs='+',
+            default=DEFAULT_PATHS,
+            help='Проверяемые пути'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Число одновременных запросов'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Число запросов к каждому пути'
+        )
+        parser.add_argument(
+            '--token',
+            type=str,
+            help='Токен пользователя для авторизованных запросов'
+        )
+        parser.add_argument(
+            '--slow-clients',
+            type=int,
+            default=0,
+            help='Число медленных клиентов, которые во время замера '
+                 'непрерывно запрашивают --slow-path'
+        )
+        parser.add_argument(
+            '--slow-rate',
+            type=int,
+            default=2048,
+            help='Скорость отправки запроса и чтения ответа медленным '
+                 'клиентом, байт/с'
+        )
+        parser.add_argument(
+            '--slow-path',
+            type=str,
+            default='/api/ingredients/',
+            help='Путь, который запрашивают медленные клиенты'
+        )
+
+    def fetch(self, url, headers):
+        """Выполняет запрос и возвращает время ответа или None
+        при ошибке."""
+        started = perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers), timeout=30) as r:
+                r.read()
+        except (HTTPError, URLError, OSError):
+            return None
+        return perf_counter() - started
+
+    def slow_fetch(self, url, headers, rate, stop):
+        """Отправляет запрос и читает ответ со скоростью rate байт/с,
+        как клиент на медленном мобильном соединении."""
+        parts = urlsplit(url)
+        lines = [
+            f'GET {parts.path or "/"}'
+            f'{"?" + parts.query if parts.query else ""} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'Connection: close',
+            *(f'{name}: {value}' for name, value in headers.items()),
+        ]
+        with socket.socket() as sock:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_CLIENT_BUFFER
+            )
+            sock.settimeout(30)
+            try:
+                sock.connect((parts.hostname, parts.port or 80))
+                request = ('\r\n'.join(lines) + '\r\n\r\n').encode()
+                for start in range(
+                    0, len(request), SLOW_CLIENT_SEND_CHUNK
+                ):
+                    if stop.is_set():
+                        return
+                    chunk = request[start:start + SLOW_CLIENT_SEND_CHUNK]
+                    sock.sendall(chunk)
+                    sleep(len(chunk) / rate)
+                while not stop.is_set():
+                    chunk = sock.recv(SLOW_CLIENT_CHUNK)
+                    if not chunk:
+                        break
+                    sleep(len(chunk) / rate)
+            except OSError:
+                pass
+
+    def start_slow_clients(self, url, headers, options):
+        """Запускает медленных клиентов и возвращает событие для их
+        остановки и их потоки."""
+        stop = Event()
+
+        def client():
+            while not stop.is_set():
+                self.slow_fetch(url, headers, options['slow_rate'], stop)
+
+        clients = [
+            Thread(target=client, daemon=True)
+            for _ in range(options['slow_clients'])
+        ]
+        for thread in clients:
+            thread.start()
+        return stop, clients
+
+    def run(self, url, headers, options):
+        """Нагружает адрес и возвращает время ответов, число ошибок
+        и общую длительность."""
+        urls = [url] * options['requests']
+        started = perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                lambda current: self.fetch(current, headers), urls
+            ))
+        elapsed = perf_counter() - started
+        timings = [result for result in results if result is not None]
+        return timings, len(results) - len(timings), elapsed
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2 or options['concurrency'] < 1:
+            raise CommandError(
+                'Нужно не меньше двух запросов и одного потока'
+            )
+        if options['slow_clients'] < 0 or options['slow_rate'] < 1:
+            raise CommandError(
+                'Число медленных клиентов не может быть отрицательным, '
+                'а их скорость должна быть положительной'
+            )
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        for base_url in options['url']:
+            self.stdout.write(self.style.MIGRATE_HEADING(base_url))
+            base_url = base_url.rstrip('/')
+            stop, clients = self.start_slow_clients(
+                base_url + options['slow_path'], headers, options
+            )
+            try:
+                self.measure(base_url, headers, options)
+            finally:
+                stop.set()
+                for thread in clients:
+                    thread.join()
+
+    def measure(self, base_url, headers, options):
+        """Нагружает пути развёртывания и выводит результаты."""
+        for path in options['paths']:
+            timings, errors, elapsed = self.run(
+                base_url + path, headers, options
+            )
+            if len(timings) < 2:
+                self.stdout.write(self.style.ERROR(
+                    f'{path}: нет успешных ответов, ошибок {errors}'
+                ))
+                continue
+            percentiles = quantiles(timings, n=100)
+            self.stdout.write(
+                f'{path}: {len(timings) / elapsed:.0f} запросов/с, '
+                f'p50 {percentiles[49] * 1000:.1f} мс, '
+                f'p95 {percentiles[94] * 1000:.1f} мс, '
+                f'p99 {percentiles[98] * 1000:.1f} мс, '
+                f'ошибок {errors}'
+            )
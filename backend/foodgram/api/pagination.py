@@ -1,6 +1,135 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .counts import get_count
+
+
+class CountCachingPaginator(Paginator):
+    """Пагинатор, получающий общее количество через кэш и оценки."""
+
+    @cached_property
+    def count(self):
+        return get_count(self.object_list)
 
 
 class CustomPagination(PageNumberPagination):
     """Класс пагинации для API запросов"""
     page_size_query_param = 'limit'
+    django_paginator_class = CountCachingPaginator
+
+
+class RecipePagination(CustomPagination):
+    """Класс пагинации рецептов.
+
+    По умолчанию работает постранично. Если в запросе передан
+    параметр cursor (в том числе пустой — для первой страницы),
+    рецепты выдаются по ключу (pub_date, id) без OFFSET и COUNT.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by('-pub_date', '-id')
+        if position is not None:
+            queryset = self.filter_after(queryset, position, reverse)
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page_results = results
+        return results
+
+    def filter_after(self, queryset, position, reverse):
+        """Оставляет рецепты после позиции (pub_date, id).
+
+        Сравнение записывается строковым значением
+        (pub_date, id) < (%s, %s), а не через OR, чтобы база данных
+        начинала просмотр индекса recipe_pub_date_id_idx прямо
+        с позиции курсора.
+        """
+        pub_date, pk = position
+        connection = connections[queryset.db]
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        pub_date = queryset.model._meta.get_field(
+            'pub_date'
+        ).get_db_prep_value(pub_date, connection)
+        return queryset.extra(
+            where=[
+                f'({table}.pub_date, {table}.id) '
+                f'{">" if reverse else "<"} (%s, %s)'
+            ],
+            params=[pub_date, pk]
+        )
+
+    def decode_cursor(self, request):
+        """Возвращает направление и позицию из параметра cursor."""
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return False, None
+        try:
+            direction, pub_date, pk = urlsafe_b64decode(
+                encoded.encode()
+            ).decode().split('|')
+            return direction == 'r', (datetime.fromisoformat(pub_date),
+                                      int(pk))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse=False):
+        """Возвращает ссылку на страницу после (или до) рецепта."""
+        token = urlsafe_b64encode('|'.join((
+            'r' if reverse else 'f', recipe.pub_date.isoformat(),
+            str(recipe.pk)
+        )).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, token
+        )
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.encode_cursor(self.page_results[-1])
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.page_results:
+            return replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, ''
+            )
+        return self.encode_cursor(self.page_results[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
@@ -0,0 +1,218 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+VERSION_KEY = 'recipe-cache-version:{}'
+RESPONSE_KEY = 'recipe-response:{}:{}'
+
+# Версия всех ответов со списками рецептов
+LIST_VERSION = 'list'
+# Версия данных, общих для всех рецептов: авторов и ингредиентов
+SHARED_VERSION = 'shared'
+# Параметры, при которых список рецептов зависит от пользователя
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_recipe_version(recipe_id):
+    """Возвращает имя версии отдельного рецепта."""
+    return f'recipe:{recipe_id}'
+
+
+def bump_versions(*names):
+    """Увеличивает версии после фиксации транзакции.
+
+    Если увеличить версию до фиксации, параллельный запрос может
+    закэшировать ещё старые данные под новой версией.
+    """
+    def bump():
+        for name in names:
+            key = VERSION_KEY.format(name)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def get_recipes(data):
+    """Возвращает рецепты из данных ответа со списком или
+    с одним рецептом."""
+    if 'results' in data:
+        return data['results']
+    return [data]
+
+
+def set_user_flags(recipe, favorited, in_shopping_cart, subscribed):
+    """Возвращает копию рецепта с заданными флагами пользователя."""
+    return {
+        **recipe,
+        'author': {**recipe['author'], 'is_subscribed': subscribed},
+        'is_favorited': favorited,
+        'is_in_shopping_cart': in_shopping_cart,
+    }
+
+
+def replace_recipes(data, recipes):
+    """Возвращает копию данных ответа с заменёнными рецептами."""
+    if 'results' in data:
+        return {**data, 'results': recipes}
+    return recipes[0]
+
+
+def clear_user_flags(data):
+    """Возвращает данные ответа в виде для анонимного пользователя."""
+    return replace_recipes(data, [
+        set_user_flags(recipe, False, False, False)
+        for recipe in get_recipes(data)
+    ])
+
+
+def get_user_flag_querysets(user, recipes):
+    """Возвращает запросы id рецептов в избранном и списке покупок
+    пользователя и id авторов, на которых он подписан."""
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    return (
+        user.favorites.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True),
+        user.shopping_cart.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True),
+        user.subscriber.filter(
+            author_id__in=author_ids
+        ).values_list('author_id', flat=True),
+    )
+
+
+def set_recipes_flags(data, recipes, favorites, shopping_cart,
+                      subscriptions):
+    """Возвращает данные ответа с флагами рецептов по множествам id."""
+    return replace_recipes(data, [
+        set_user_flags(
+            recipe,
+            recipe['id'] in favorites,
+            recipe['id'] in shopping_cart,
+            recipe['author']['id'] in subscriptions
+        )
+        for recipe in recipes
+    ])
+
+
+def apply_user_flags(data, user):
+    """Возвращает данные ответа с флагами избранного, списка покупок
+    и подписки пользователя."""
+    recipes = get_recipes(data)
+    return set_recipes_flags(data, recipes, *(
+        set(queryset)
+        for queryset in get_user_flag_querysets(user, recipes)
+    ))
+
+
+async def aapply_user_flags(data, user):
+    """Асинхронная версия apply_user_flags."""
+    recipes = get_recipes(data)
+    flags = []
+    for queryset in get_user_flag_querysets(user, recipes):
+        flags.append({value async for value in queryset})
+    return set_recipes_flags(data, recipes, *flags)
+
+
+class RecipeResponseCache:
+    """Кэш данных ответов со списком рецептов и отдельным рецептом.
+
+    Ответы хранятся в виде для анонимного пользователя с ключом из
+    адреса запроса и версий данных: списки зависят от общей версии,
+    отдельный рецепт — от своей версии и версии авторов
+    и ингредиентов. Для авторизованного пользователя поверх
+    закэшированных данных проставляются его флаги.
+    """
+
+    def __init__(self, backend, max_size, timeout):
+        self._backend_path = backend
+        self._max_size = max_size
+        self._timeout = timeout
+        self._backend = None
+
+    @property
+    def backend(self):
+        """Хранилище ответов, создаётся при первом обращении."""
+        if self._backend is None:
+            self._backend = import_string(self._backend_path)(
+                self._max_size, timeout=self._timeout
+            )
+        return self._backend
+
+    @staticmethod
+    def is_cacheable(request):
+        """Проверяет, что ответ на запрос не зависит от пользователя
+        сильнее, чем флагами рецептов."""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if not request.user.is_authenticated:
+            return True
+        return not any(
+            request.GET.get(name) not in (None, '', '0', 'false')
+            for name in USER_FILTERS
+        )
+
+    @staticmethod
+    def get_version_keys(recipe_id=None):
+        """Возвращает ключи версий, от которых зависит ответ."""
+        if recipe_id is None:
+            names = [LIST_VERSION]
+        else:
+            names = [get_recipe_version(recipe_id), SHARED_VERSION]
+        return [VERSION_KEY.format(name) for name in names]
+
+    @staticmethod
+    def make_key(request, keys, versions):
+        """Возвращает ключ ответа по адресу запроса и версиям."""
+        params = sorted(
+            (name, value)
+            for name, values in request.GET.lists()
+            for value in values
+        )
+        url = request.build_absolute_uri(request.path)
+        return RESPONSE_KEY.format(
+            ':'.join(str(versions.get(key, 0)) for key in keys),
+            repr((url, params))
+        )
+
+    def get_key(self, request, recipe_id=None):
+        """Возвращает ключ ответа с учётом версий данных."""
+        keys = self.get_version_keys(recipe_id)
+        return self.make_key(request, keys, cache.get_many(keys))
+
+    async def aget_key(self, request, recipe_id=None):
+        """Асинхронная версия get_key."""
+        keys = self.get_version_keys(recipe_id)
+        return self.make_key(request, keys, await cache.aget_many(keys))
+
+    def get(self, request, key):
+        """Возвращает данные ответа для пользователя запроса
+        или None."""
+        data = self.backend.get(key)
+        if data is not None and request.user.is_authenticated:
+            data = apply_user_flags(data, request.user)
+        return data
+
+    async def aget(self, request, key):
+        """Асинхронная версия get."""
+        data = self.backend.get(key)
+        if data is not None and request.user.is_authenticated:
+            data = await aapply_user_flags(data, request.user)
+        return data
+
+    def set(self, key, data):
+        """Сохраняет данные ответа без флагов пользователя."""
+        self.backend.set(key, clear_user_flags(data))
+
+
+recipe_response_cache = RecipeResponseCache(
+    backend=settings.RECIPE_CACHE_BACKEND,
+    max_size=settings.RECIPE_CACHE_SIZE,
+    timeout=settings.RECIPE_CACHE_TIMEOUT
+)
@@ -0,0 +1,73 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Символы, которые DRF экранирует, чтобы JSON был подмножеством JavaScript
+JS_UNSAFE_CHARS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Рендерер JSON, использующий orjson, если он установлен.
+
+    Результат совпадает с рендерером DRF: компактный JSON без
+    экранирования не-ASCII символов, а даты, Decimal и прочие
+    нестандартные типы преобразуются кодировщиком DRF. С отступами
+    и при других настройках COMPACT_JSON и UNICODE_JSON используется
+    стандартный json.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact
+                or self.ensure_ascii or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        ret = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        for char, escaped in JS_UNSAFE_CHARS:
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Базовый рендерер для готовых ответов.
+
+    Содержимое файлов формирует само представление; через рендерер
+    проходят только ответы с ошибками, которые отдаются как JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return FastJSONRenderer().render(data)
+
+
+class PDFRenderer(PassthroughRenderer):
+    """Рендерер для ответов в формате PDF."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class PlainTextRenderer(PassthroughRenderer):
+    """Рендерер для ответов в текстовом формате."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(PassthroughRenderer):
+    """Рендерер для ответов в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,24 +1,41 @@
+import json
+
 from djoser.serializers import (
     UserCreateSerializer as DjoserUserCreateSerializer)
 from djoser.serializers import UserSerializer as DjoserUserSerializer
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from rest_framework import status
-from rest_framework.fields import ReadOnlyField
 
 
+from recipes.images import get_variant_urls
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem
 )
-from users.models import Subscription, User
+from users.models import User
 from consts import MyConsts
+from .counts import bump_version
+from .fields import HybridImageField
+from .shopping_list import shopping_list_pdf_cache
+
+
+def get_file_url(file, request):
+    """Возвращает ссылку на файл так же, как поле файла DRF."""
+    if not file:
+        return None
+    url = file.url
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
 
 
 class UserSerializer(DjoserUserSerializer):
     """Класс-сериализатор пользователя"""
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField(required=False)
+    avatar = HybridImageField(required=False)
 
     class Meta:
         model = User
@@ -29,15 +46,32 @@ class UserSerializer(DjoserUserSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод проверки подписки пользователя на автора"""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         user = request.user
-        return user.subscription.filter(author=obj).exists()
+        return user.subscriber.filter(author=obj).exists()
         # return Subscription.objects.filter(
         #     user=request.user, author=obj
         # ).exists()
 
+    def to_representation(self, instance):
+        """Метод построения представления пользователя напрямую,
+        без обхода полей сериализатора"""
+        return {
+            'id': instance.id,
+            'email': instance.email,
+            'username': instance.username,
+            'first_name': instance.first_name,
+            'last_name': instance.last_name,
+            'is_subscribed': self.get_is_subscribed(instance),
+            'avatar': get_file_url(
+                instance.avatar, self.context.get('request')
+            ),
+        }
+
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
     """Класс-сериализатор для создания пользователя"""
@@ -51,7 +85,7 @@ class UserCreateSerializer(DjoserUserCreateSerializer):
 class SubscribeSerializer(UserSerializer):
     """Класс-сериализатор совершения подписки на автора"""
     recipes = serializers.SerializerMethodField()
-    recipes_count = ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -62,34 +96,33 @@ class SubscribeSerializer(UserSerializer):
 
     def get_recipes(self, obj):
         """Метод получение рецептов от автора"""
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeShortSerializer(recipes, many=True,
                                      context=self.context).data
 
-
-class SubscriptionSerializer(serializers.ModelSerializer):
-    """Класс-сериализатор подписок пользователя"""
-    class Meta:
-        model = Subscription
-        fields = ('user', 'author')
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author'),
-                message='Вы уже подписаны на этого автора'
-            )
-        ]
-
-    def validate(self, data):
-        """Метод валидации подписок"""
-        if data['user'] == data['author']:
-            raise serializers.ValidationError('Нельзя'
-                                              ' подписаться на самого себя')
-        return data
+    def to_representation(self, instance):
+        """Метод построения представления автора с рецептами
+        напрямую, без обхода полей сериализатора"""
+        return {
+            'email': instance.email,
+            'id': instance.id,
+            'username': instance.username,
+            'first_name': instance.first_name,
+            'last_name': instance.last_name,
+            'is_subscribed': self.get_is_subscribed(instance),
+            'recipes': self.get_recipes(instance),
+            'recipes_count': instance.recipes_count,
+            'avatar': get_file_url(
+                instance.avatar, self.context.get('request')
+            ),
+        }
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -136,6 +169,34 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Класс-сериализатор списка рецептов для массовых операций"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MyConsts.MAX_BULK_RECIPES
+    )
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Класс-сериализатор запроса в составе пакета"""
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+    )
+    path = serializers.RegexField(r'^/api/')
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Класс-сериализатор пакета запросов"""
+    requests = serializers.ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=MyConsts.MAX_BATCH_REQUESTS
+    )
+    atomic = serializers.BooleanField(default=False)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Класс-сериализатор для ингредиентов"""
     class Meta:
@@ -155,6 +216,30 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
+    def to_representation(self, instance):
+        """Метод построения представления ингредиента рецепта
+        напрямую, без обхода полей сериализатора"""
+        ingredient = instance.ingredient
+        return {
+            'id': ingredient.id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': instance.amount,
+        }
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Класс-сериализатор для суммарного списка покупок"""
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """Класс-сриализатор для добавления ингредиентов в рецепте"""
@@ -177,6 +262,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True, read_only=True, source='recipe_ingredients'
     )
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -188,11 +274,18 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
 
+    def get_image_variants(self, obj):
+        """Метод получения ссылок на уменьшенные копии изображения"""
+        return get_variant_urls(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
         """Метод проверки факта добавления рецепта в избранное"""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -201,6 +294,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Метод проверки факта добавления рецепт в список покупок"""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -208,11 +303,33 @@ class RecipeSerializer(serializers.ModelSerializer):
         user = request.user
         return user.shopping_cart.filter(recipe=obj).exists()
 
+    def to_representation(self, instance):
+        """Метод построения представления рецепта напрямую,
+        без обхода полей сериализатора"""
+        request = self.context.get('request')
+        author = self.fields['author']
+        ingredient = self.fields['ingredients'].child
+        return {
+            'id': instance.id,
+            'author': author.to_representation(instance.author),
+            'ingredients': [
+                ingredient.to_representation(row)
+                for row in instance.recipe_ingredients.all()
+            ],
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+            'name': instance.name,
+            'image': get_file_url(instance.image, request),
+            'image_variants': get_variant_urls(instance, request),
+            'text': instance.text,
+            'cooking_time': instance.cooking_time,
+        }
+
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Класс-сериализатор для создания и обновления рецептов."""
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField(required=True)
+    image = HybridImageField(required=True)
     author = UserSerializer(read_only=True)
 
     class Meta:
@@ -222,9 +339,23 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             'name', 'image', 'text', 'cooking_time'
         )
 
+    def to_internal_value(self, data):
+        """Разбирает ингредиенты, переданные строкой JSON
+        в multipart-запросе."""
+        if hasattr(data, 'getlist'):
+            data = data.dict()
+            if isinstance(data.get('ingredients'), str):
+                try:
+                    data['ingredients'] = json.loads(data['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'ingredients': ['Некорректный JSON']}
+                    )
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """Проверяет валидность данных."""
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Необходимо указать хотя бы один ингредиент'
@@ -260,6 +391,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             )
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Метод создания рецепта"""
         ingredients = validated_data.pop('ingredients')
@@ -270,6 +402,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Метод обновления рецепта"""
         ingredients = validated_data.pop('ingredients')
@@ -281,23 +414,94 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         )
         if 'image' in validated_data:
             instance.image = validated_data.get('image')
-        # Обновление ингредиентов
-        instance.ingredients.clear()
-        self.create_ingredients(ingredients, instance)
+        self.update_ingredients(ingredients, instance)
         instance.save()
         return instance
 
+    def update_ingredients(self, ingredients, recipe):
+        """Метод обновления ингредиентов рецепта:
+        записываются только изменившиеся строки."""
+        current = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredients.select_for_update()
+        }
+        submitted = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = {}
+        removed = []
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = submitted.get(ingredient_id)
+            if amount is None:
+                removed.append(ingredient_id)
+            elif amount != row.amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in submitted.items()
+            if ingredient_id not in current
+        ]
+        deltas.update((row.ingredient_id, row.amount) for row in added)
+        if not (deltas or removed):
+            return
+        # Массовые операции не отправляют сигналы, поэтому списки
+        # покупок, кэш PDF и версии счётчиков обновляются явно
+        deleted = RecipeIngredient.objects.delete_ingredients(
+            recipe.id, removed
+        )
+        deltas.update(
+            (ingredient_id, -amount)
+            for ingredient_id, amount in deleted.items()
+        )
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if recipe.in_shopping_cart.exists():
+            ShoppingListItem.objects.apply_ingredients(recipe.id, deltas)
+            shopping_list_pdf_cache.invalidate_all()
+        bump_version(RecipeIngredient._meta.db_table)
+
     def to_representation(self, instance):
         """Метод преобразование объект Recipe
         в представление RecipeSerializer."""
+        request = self.context.get('request')
+        user = request.user if request else None
+        instance = Recipe.objects.with_related(user).with_user_flags(
+            user
+        ).get(pk=instance.pk)
         return RecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Класс-сериализатор для краткого представления рецепта"""
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        """Метод получения ссылок на уменьшенные копии изображения"""
+        return get_variant_urls(obj, self.context.get('request'))
+
+    def to_representation(self, instance):
+        """Метод построения краткого представления рецепта
+        напрямую, без обхода полей сериализатора"""
+        request = self.context.get('request')
+        return {
+            'id': instance.id,
+            'name': instance.name,
+            'image': get_file_url(instance.image, request),
+            'image_variants': get_variant_urls(instance, request),
+            'cooking_time': instance.cooking_time,
+        }
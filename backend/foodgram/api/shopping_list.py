@@ -0,0 +1,156 @@
+import csv
+import hashlib
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from .cache import LRUCache
+from .shopping_list_pdf import ShoppingListPDFRenderer
+
+SHOPPING_LIST_CHUNK_SIZE = 500
+# Общие для всех процессов версии списков покупок: всех
+# пользователей и отдельного пользователя
+ALL_VERSION_KEY = 'shopping-list-version'
+USER_VERSION_KEY = 'shopping-list-version:{}'
+
+
+def get_shopping_list_queryset(user):
+    """Возвращает запрос суммарного списка ингредиентов из списка
+    покупок в виде кортежей (название, единица измерения, количество).
+    """
+    return ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name')
+
+
+def get_shopping_list(user):
+    """Возвращает суммарный список ингредиентов из списка покупок."""
+    return list(get_shopping_list_queryset(user))
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную строку вместо её
+    сохранения."""
+
+    def write(self, value):
+        return value
+
+
+def iter_shopping_list_txt(user):
+    """Построчно формирует список покупок в текстовом формате,
+    читая ингредиенты серверным курсором."""
+    yield 'Список покупок\n'
+    ingredients = get_shopping_list_queryset(user).iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE
+    )
+    for name, measurement_unit, amount in ingredients:
+        yield f'{name} — {amount} {measurement_unit}\n'
+
+
+def iter_shopping_list_csv(user):
+    """Построчно формирует список покупок в формате CSV,
+    читая ингредиенты серверным курсором."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    ingredients = get_shopping_list_queryset(user).iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE
+    )
+    for name, measurement_unit, amount in ingredients:
+        yield writer.writerow((name, amount, measurement_unit))
+
+
+class ShoppingListPDFCache:
+    """Кэш отрендеренных PDF списков покупок.
+
+    PDF хранятся по хешу суммарного списка ингредиентов, поэтому
+    одинаковые списки разных пользователей рендерятся один раз.
+    Для каждого пользователя запоминается хеш его текущего списка
+    вместе с версиями списков в кэше Django, которые увеличиваются
+    после фиксации изменений списка покупок. Если CACHES не общий
+    для всех процессов, устаревание хеша в других процессах
+    ограничено timeout секунд.
+    """
+
+    def __init__(self, max_size, max_users, timeout):
+        self._pdfs = LRUCache(max_size, get_size=len)
+        self._user_keys = LRUCache(max_users, timeout=timeout)
+
+    @staticmethod
+    def get_key(ingredients):
+        """Возвращает хеш списка ингредиентов."""
+        return hashlib.sha256(repr(ingredients).encode()).hexdigest()
+
+    @staticmethod
+    def get_versions(user_id):
+        """Возвращает текущие версии списка покупок пользователя."""
+        keys = [ALL_VERSION_KEY, USER_VERSION_KEY.format(user_id)]
+        versions = cache.get_many(keys)
+        return tuple(versions.get(key, 0) for key in keys)
+
+    @staticmethod
+    def bump_version(key):
+        """Увеличивает версию после фиксации транзакции.
+
+        Если увеличить версию до фиксации, параллельный запрос может
+        запомнить хеш ещё старого списка под новой версией.
+        """
+        def bump():
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+        transaction.on_commit(bump)
+
+    def get_pdf(self, user):
+        """Возвращает файловый объект с PDF списка покупок
+        пользователя.
+
+        PDF рендерится во временный файл, который держится в памяти
+        только до SHOPPING_LIST_PDF_SPOOL_SIZE байт, и кэшируется,
+        если укладывается в бюджет кэша.
+        """
+        versions = self.get_versions(user.id)
+        cached = self._user_keys.get(user.id)
+        if cached is not None and cached[0] == versions:
+            pdf = self._pdfs.get(cached[1])
+            if pdf is not None:
+                return BytesIO(pdf)
+        ingredients = get_shopping_list(user)
+        key = self.get_key(ingredients)
+        self._user_keys.set(user.id, (versions, key))
+        pdf = self._pdfs.get(key)
+        if pdf is not None:
+            return BytesIO(pdf)
+        output = SpooledTemporaryFile(
+            max_size=settings.SHOPPING_LIST_PDF_SPOOL_SIZE
+        )
+        ShoppingListPDFRenderer().render(ingredients, output)
+        if output.tell() <= self._pdfs.max_size:
+            output.seek(0)
+            self._pdfs.set(key, output.read())
+        output.seek(0)
+        return output
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает список покупок пользователя."""
+        self.bump_version(USER_VERSION_KEY.format(user_id))
+
+    def invalidate_all(self):
+        """Сбрасывает списки покупок всех пользователей.
+
+        Сами PDF остаются в кэше: они адресуются содержимым
+        и не устаревают.
+        """
+        self.bump_version(ALL_VERSION_KEY)
+
+
+shopping_list_pdf_cache = ShoppingListPDFCache(
+    max_size=settings.SHOPPING_LIST_PDF_CACHE_SIZE,
+    max_users=settings.SHOPPING_LIST_PDF_CACHE_USERS,
+    timeout=settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT
+)
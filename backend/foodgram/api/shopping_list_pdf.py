@@ -0,0 +1,84 @@
+from threading import Lock
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from consts import FontConst
+
+
+class ShoppingListPDFRenderer:
+    """Рендерер списка покупок в PDF.
+
+    Шрифт регистрируется один раз на процесс; reportlab встраивает
+    в документ только подмножество использованных глифов. Строки
+    раскладываются по страницам пачками, и каждая страница выводится
+    одним текстовым объектом вместо отдельного drawString на строку.
+    """
+    font_name = 'DejaVuSans'
+    font_file = 'DejaVuSans.ttf'
+    _font_lock = Lock()
+
+    @classmethod
+    def register_font(cls):
+        """Регистрирует шрифт с поддержкой кириллицы один раз
+        на процесс."""
+        if cls.font_name in pdfmetrics.getRegisteredFontNames():
+            return
+        with cls._font_lock:
+            if cls.font_name not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(cls.font_name, cls.font_file))
+
+    @staticmethod
+    def lines_per_page(y_start):
+        """Возвращает число строк, помещающихся на страницу
+        начиная с высоты y_start."""
+        return -(-(y_start - FontConst.NEW_PAGE_CHECK)
+                 // FontConst.Y_POSITION_UPDATE)
+
+    def iter_pages(self, lines):
+        """Разбивает строки на пачки по страницам.
+
+        Возвращает пары (начальная высота, строки страницы).
+        """
+        y_start = FontConst.Y_POSITION
+        batch = []
+        limit = self.lines_per_page(y_start)
+        for line in lines:
+            batch.append(line)
+            if len(batch) == limit:
+                yield y_start, batch
+                y_start = FontConst.SET_FONT_Y_TITLE
+                batch = []
+                limit = self.lines_per_page(y_start)
+        if batch:
+            yield y_start, batch
+
+    def render(self, ingredients, output):
+        """Рендерит список покупок в PDF и записывает его в output.
+
+        ingredients — кортежи (название, единица измерения, количество).
+        """
+        self.register_font()
+        p = canvas.Canvas(output)
+        # Заголовок документа
+        p.setFont(self.font_name, FontConst.SIZE_FONT_REG)
+        p.drawString(FontConst.SET_FONT_X_TITLE, FontConst.SET_FONT_Y_TITLE,
+                     'Список покупок')
+        lines = (
+            f'{name} — {amount} {measurement_unit}'
+            for name, measurement_unit, amount in ingredients
+        )
+        for page_number, (y_start, batch) in enumerate(
+            self.iter_pages(lines)
+        ):
+            if page_number:
+                p.showPage()
+            text = p.beginText(FontConst.X_POSITION, y_start)
+            text.setFont(self.font_name, FontConst.SIZE_FONT,
+                         leading=FontConst.Y_POSITION_UPDATE)
+            for line in batch:
+                text.textLine(line)
+            p.drawText(text)
+        p.showPage()
+        p.save()
@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart
+)
+from users.models import User
+from .authentication import token_cache
+from .counts import bump_version
+from .recipe_cache import (
+    LIST_VERSION, SHARED_VERSION, bump_versions, get_recipe_version
+)
+from .shopping_list import shopping_list_pdf_cache
+
+# Поля пользователя, которые входят в представление автора рецепта
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar')
+
+
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def invalidate_user_shopping_list(sender, instance, **kwargs):
+    """Сбрасывает кэш списка покупок пользователя при изменении
+    его списка покупок."""
+    shopping_list_pdf_cache.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_shopping_lists(sender, **kwargs):
+    """Сбрасывает кэш списков покупок при изменении ингредиентов."""
+    shopping_list_pdf_cache.invalidate_all()
+
+
+@receiver([post_save, post_delete])
+def invalidate_counts(sender, **kwargs):
+    """Сбрасывает закэшированные количества строк для таблицы
+    изменённой модели."""
+    bump_version(sender._meta.db_table)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    """Сбрасывает закэшированные ответы с изменённым рецептом."""
+    bump_versions(LIST_VERSION, get_recipe_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def invalidate_recipe_ingredient_responses(sender, instance, **kwargs):
+    """Сбрасывает закэшированные ответы с рецептом, ингредиенты
+    которого изменились."""
+    bump_versions(LIST_VERSION, get_recipe_version(instance.recipe_id))
+
+
+@receiver(pre_save, sender=User)
+def check_author_fields(sender, instance, update_fields=None, **kwargs):
+    """Запоминает, изменились ли при сохранении пользователя поля,
+    которые показываются в рецептах."""
+    fields = [
+        name for name in AUTHOR_FIELDS
+        if update_fields is None or name in update_fields
+    ]
+    if instance.pk is None or not fields:
+        instance._author_changed = bool(fields)
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(*fields).first()
+    new = tuple(
+        field.get_prep_value(field.value_from_object(instance))
+        for field in map(User._meta.get_field, fields)
+    )
+    instance._author_changed = old != new
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_author_responses(sender, instance, created=False, **kwargs):
+    """Сбрасывает закэшированные ответы при изменении полей
+    пользователя, которые показываются в рецептах.
+
+    Регистрация, смена пароля и входы не сбрасывают кэш: новый
+    пользователь ещё не автор рецептов, а остальные поля в ответы
+    не входят.
+    """
+    if created or not instance.__dict__.pop('_author_changed', True):
+        return
+    bump_versions(LIST_VERSION, SHARED_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_responses(sender, created=False, **kwargs):
+    """Сбрасывает закэшированные ответы при изменении ингредиента.
+
+    Новый ингредиент ещё не входит ни в один рецепт.
+    """
+    if not created:
+        bump_versions(LIST_VERSION, SHARED_VERSION)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    """Сбрасывает кэш удалённого токена, например при выходе."""
+    token_cache.delete(instance.key)
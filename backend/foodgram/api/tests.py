@@ -0,0 +1,446 @@
+import threading
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.db.models import Prefetch, Value
+from django.test import TestCase, TransactionTestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import (
+    APIClient, APIRequestFactory, force_authenticate
+)
+
+from consts import ImageConst
+from recipes.images import SOURCE_KEY
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem
+)
+from users.models import Subscription, User
+from api.serializers import (
+    RecipeIngredientSerializer, RecipeSerializer, RecipeShortSerializer,
+    SubscribeSerializer, UserSerializer
+)
+from api.views import RecipeViewSet, UserViewSet
+
+# Представление через обход полей сериализатора
+generic = serializers.ModelSerializer.to_representation
+
+
+class ReferenceUserSerializer(UserSerializer):
+    to_representation = generic
+
+
+class ReferenceRecipeIngredientSerializer(RecipeIngredientSerializer):
+    to_representation = generic
+
+
+class ReferenceRecipeShortSerializer(RecipeShortSerializer):
+    to_representation = generic
+
+
+class ReferenceRecipeSerializer(RecipeSerializer):
+    author = ReferenceUserSerializer(read_only=True)
+    ingredients = ReferenceRecipeIngredientSerializer(
+        many=True, read_only=True, source='recipe_ingredients'
+    )
+    to_representation = generic
+
+
+class ReferenceSubscribeSerializer(SubscribeSerializer):
+    to_representation = generic
+
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            limit = self.context['request'].GET.get('recipes_limit')
+            if limit and limit.isdigit():
+                recipes = recipes[:int(limit)]
+        return ReferenceRecipeShortSerializer(
+            recipes, many=True, context=self.context
+        ).data
+
+
+def create_user(number):
+    """Создаёт пользователя для тестов."""
+    return User.objects.create_user(
+        email=f'user{number}@foodgram.test',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password-12345'
+    )
+
+
+def is_in_memory_db():
+    """Проверяет, что тесты идут на SQLite в памяти, где потоки
+    не могут писать в базу параллельно."""
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+class ToggleConcurrencyTests(TransactionTestCase):
+    """Переключатели избранного, списка покупок и подписки под
+    параллельными запросами."""
+    threads = 8
+
+    def setUp(self):
+        if is_in_memory_db():
+            self.skipTest(
+                'Нужна база с параллельными соединениями: PostgreSQL '
+                'или SQLite с файловой тестовой базой (DB_TEST_NAME)'
+            )
+        self.user = create_user(1)
+        self.author = create_user(2)
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Блины',
+            image='recipes/images/pancakes.png',
+            text='Смешать и пожарить',
+            cooking_time=20
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=200
+        )
+
+    def hammer(self, view, path, kwargs, method):
+        """Отправляет одинаковые запросы одновременно из нескольких
+        потоков и возвращает счётчик кодов ответа."""
+        factory = APIRequestFactory()
+        barrier = threading.Barrier(self.threads)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            request = getattr(factory, method)(path)
+            force_authenticate(request, user=self.user)
+            barrier.wait()
+            try:
+                code = view(request, **kwargs).status_code
+            except Exception:
+                code = 500
+            finally:
+                connection.close()
+            with lock:
+                statuses[code] += 1
+
+        workers = [
+            threading.Thread(target=worker) for _ in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return statuses
+
+    def check_toggle(self, view, path, kwargs, relation):
+        """Проверяет, что из параллельных добавлений и удалений
+        успешен ровно один запрос, а остальные получают 400."""
+        for method, success in (('post', 201), ('delete', 204)):
+            with self.subTest(method=method):
+                statuses = self.hammer(view, path, kwargs, method)
+                self.assertEqual(
+                    statuses, Counter({success: 1, 400: self.threads - 1})
+                )
+                self.assertEqual(relation.count(), int(method == 'post'))
+
+    def test_favorite(self):
+        view = RecipeViewSet.as_view(
+            {'post': 'favorite', 'delete': 'favorite'}
+        )
+        path = f'/api/recipes/{self.recipe.pk}/favorite/'
+        kwargs = {'pk': self.recipe.pk}
+        # Рецепт уже в избранном у другого пользователя
+        Favorite.objects.create(user=self.author, recipe=self.recipe)
+        for method, success, count in (('post', 201, 2), ('delete', 204, 1)):
+            with self.subTest(method=method):
+                self.assertEqual(
+                    self.hammer(view, path, kwargs, method),
+                    Counter({success: 1, 400: self.threads - 1})
+                )
+                self.recipe.refresh_from_db()
+                self.assertEqual(self.recipe.favorites_count, count)
+        self.assertFalse(
+            Favorite.objects.filter(user=self.user).exists()
+        )
+
+    def test_shopping_cart(self):
+        view = RecipeViewSet.as_view(
+            {'post': 'shopping_cart', 'delete': 'shopping_cart'}
+        )
+        path = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        kwargs = {'pk': self.recipe.pk}
+        # В списке покупок уже есть другой рецепт с тем же ингредиентом
+        # и рецепт с другим ингредиентом
+        sugar = Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        for ingredient, amount in ((self.ingredient, 7), (sugar, 30)):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f'Рецепт с ингредиентом {ingredient.name}',
+                image='recipes/images/other.png',
+                text='Смешать',
+                cooking_time=5
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        items = ShoppingListItem.objects.filter(user=self.user).order_by(
+            'ingredient_id'
+        )
+        for method, success, amount in (
+            ('post', 201, 207), ('delete', 204, 7)
+        ):
+            with self.subTest(method=method):
+                self.assertEqual(
+                    self.hammer(view, path, kwargs, method),
+                    Counter({success: 1, 400: self.threads - 1})
+                )
+                self.assertEqual(
+                    list(items.values_list('ingredient_id', 'amount')),
+                    [(self.ingredient.pk, amount), (sugar.pk, 30)]
+                )
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+
+    def test_subscription(self):
+        self.check_toggle(
+            UserViewSet.as_view({'post': 'subscribe', 'delete': 'subscribe'}),
+            f'/api/users/{self.author.pk}/subscribe/',
+            {'id': self.author.pk},
+            Subscription.objects.filter(user=self.user, author=self.author)
+        )
+
+
+class ToggleTests(TransactionTestCase):
+    """Переключатели при удалении связанного объекта."""
+
+    def test_favorite_deleted_recipe(self):
+        """Добавление рецепта, удалённого параллельным запросом,
+        возвращает 404, а не ошибку целостности."""
+        user = create_user(1)
+        recipe = Recipe.objects.create(
+            author=create_user(2),
+            name='Блины',
+            image='recipes/images/pancakes.png',
+            text='Смешать и пожарить',
+            cooking_time=20
+        )
+        view = RecipeViewSet.as_view({'post': 'favorite'})
+        request = APIRequestFactory().post(
+            f'/api/recipes/{recipe.pk}/favorite/'
+        )
+        force_authenticate(request, user=user)
+        with mock.patch(
+            'api.views.get_object_or_404', return_value=recipe
+        ):
+            Recipe.objects.filter(pk=recipe.pk).delete()
+            response = view(request, pk=recipe.pk)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+
+
+class FastSerializerTests(TestCase):
+    """Быстрые to_representation сериализаторов чтения совпадают
+    с представлением через обход полей DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(1)
+        cls.author = create_user(2)
+        cls.author.avatar = 'users/avatars/author.png'
+        cls.author.save()
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар', 'Яйца')
+        ]
+        cls.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author if number else cls.user,
+                name=f'Рецепт {number}',
+                image=f'recipes/images/recipe{number}.png',
+                text='Смешать',
+                cooking_time=10 + number
+            )
+            for amount, ingredient in enumerate(cls.ingredients[number:]):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount + 1
+                )
+            cls.recipes.append(recipe)
+        # У первого рецепта есть уменьшенные копии, у остальных нет
+        variants = {SOURCE_KEY: cls.recipes[0].image.name}
+        for size in ImageConst.VARIANT_SIZES:
+            variants[size] = {
+                extension: f'{ImageConst.VARIANTS_DIR}{size}.{extension}'
+                for extension in ImageConst.VARIANT_FORMATS
+            }
+        Recipe.objects.filter(pk=cls.recipes[0].pk).update(
+            image_variants=variants
+        )
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[2])
+        Subscription.objects.create(user=cls.user, author=cls.author)
+
+    def get_request(self, user, **params):
+        """Возвращает запрос DRF от имени пользователя."""
+        request = Request(APIRequestFactory().get('/api/', params))
+        request.user = user
+        return request
+
+    def assertSameJSON(self, fast, reference, objects, request):
+        """Проверяет, что сериализаторы дают одинаковый JSON."""
+        objects = list(objects)
+        context = {'request': request}
+        self.assertEqual(
+            JSONRenderer().render(
+                fast(objects, many=True, context=context).data
+            ),
+            JSONRenderer().render(
+                reference(objects, many=True, context=context).data
+            )
+        )
+
+    def test_recipes(self):
+        for user in (AnonymousUser(), self.user):
+            request = self.get_request(user)
+            with self.subTest(user=user, annotated=True):
+                self.assertSameJSON(
+                    RecipeSerializer, ReferenceRecipeSerializer,
+                    Recipe.objects.with_related(user).with_user_flags(user),
+                    request
+                )
+            with self.subTest(user=user, annotated=False):
+                self.assertSameJSON(
+                    RecipeSerializer, ReferenceRecipeSerializer,
+                    Recipe.objects.all(), request
+                )
+
+    def test_short_recipes(self):
+        self.assertSameJSON(
+            RecipeShortSerializer, ReferenceRecipeShortSerializer,
+            Recipe.objects.all(), self.get_request(self.user)
+        )
+
+    def test_users(self):
+        for user in (AnonymousUser(), self.user):
+            with self.subTest(user=user):
+                self.assertSameJSON(
+                    UserSerializer, ReferenceUserSerializer,
+                    User.objects.all(), self.get_request(user)
+                )
+
+    def test_subscriptions(self):
+        for limit in ('', '1', 'x'):
+            request = self.get_request(self.user, recipes_limit=limit)
+            authors = User.objects.filter(recipes__isnull=False).distinct()
+            with self.subTest(recipes_limit=limit, prefetched=False):
+                self.assertSameJSON(
+                    SubscribeSerializer, ReferenceSubscribeSerializer,
+                    authors.annotate(is_subscribed=Value(True)), request
+                )
+            recipes = Recipe.objects.order_by('-pub_date')
+            if limit.isdigit():
+                recipes = recipes[:int(limit)]
+            with self.subTest(recipes_limit=limit, prefetched=True):
+                self.assertSameJSON(
+                    SubscribeSerializer, ReferenceSubscribeSerializer,
+                    authors.prefetch_related(Prefetch(
+                        'recipes', queryset=recipes,
+                        to_attr='limited_recipes'
+                    )),
+                    request
+                )
+
+
+class TokenCacheTests(TestCase):
+    """Аутентификация по токену с кэшем токенов."""
+
+    def setUp(self):
+        self.user = create_user(1)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+        # Первый запрос кладёт токен в кэш
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_logout(self):
+        """После выхода токен больше не принимается."""
+        self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation(self):
+        """Деактивация пользователя, даже без сигналов, сразу
+        запрещает доступ по закэшированному токену."""
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_write_after_counter_change(self):
+        """Сохранение пользователя после изменения счётчика рецептов
+        не возвращает счётчику старое значение."""
+        Recipe.objects.create(
+            author=self.user,
+            name='Блины',
+            image='recipes/images/pancakes.png',
+            text='Смешать и пожарить',
+            cooking_time=20
+        )
+        self.assertEqual(
+            self.client.delete('/api/users/me/avatar/').status_code, 204
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+
+
+class CounterTests(TestCase):
+    """Сохранение объекта не перезаписывает счётчики, изменённые
+    после его загрузки."""
+
+    def setUp(self):
+        self.user = create_user(1)
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='Блины',
+            image='recipes/images/pancakes.png',
+            text='Смешать и пожарить',
+            cooking_time=20
+        )
+
+    def test_recipe_favorites_count(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        recipe.name = 'Оладьи'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.name, recipe.favorites_count), ('Оладьи', 1)
+        )
+
+    def test_user_recipes_count(self):
+        user = User.objects.get(pk=self.user.pk)
+        Recipe.objects.create(
+            author=self.user,
+            name='Оладьи',
+            image='recipes/images/fritters.png',
+            text='Смешать и пожарить',
+            cooking_time=15
+        )
+        user.first_name = 'Другое'
+        user.set_password('password-67890')
+        user.save()
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.first_name, user.recipes_count), ('Другое', 2)
+        )
+        self.assertTrue(user.check_password('password-67890'))
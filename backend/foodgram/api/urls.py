@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
-    IngredientViewSet, RecipeViewSet, UserViewSet
+    BatchView, IngredientViewSet, RecipeViewSet, UserViewSet
 )
 
 router = DefaultRouter()
@@ -11,6 +11,7 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
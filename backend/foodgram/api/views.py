@@ -1,33 +1,75 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import json
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Prefetch, Value
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import Resolver404, resolve
 from rest_framework.exceptions import ValidationError, NotAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from djoser.views import UserViewSet as UserDjoserViewSet
 
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+    Favorite, Ingredient, Recipe, ShoppingCart, ShoppingListItem
 )
 from users.models import Subscription, User
+from .counts import bump_version
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .ingredient_catalogue import ingredient_catalogue
+from .pagination import CustomPagination, RecipePagination
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (
-    FavoriteSerializer, IngredientSerializer, RecipeCreateUpdateSerializer,
-    RecipeSerializer, ShoppingCartSerializer, SubscribeSerializer,
-    SubscriptionSerializer,
+    BatchSerializer, FavoriteSerializer, IngredientSerializer,
+    RecipeCreateUpdateSerializer, RecipeIdsSerializer, RecipeSerializer,
+    ShoppingCartSerializer, ShoppingListItemSerializer, SubscribeSerializer,
     UserSerializer,
 )
-from consts import FontConst
+from .recipe_cache import recipe_response_cache
+from .renderers import (
+    CSVRenderer, FastJSONRenderer, PDFRenderer, PlainTextRenderer
+)
+from .shopping_list import (
+    iter_shopping_list_csv, iter_shopping_list_txt, shopping_list_pdf_cache
+)
+
+
+# URLconf с синхронными представлениями. При запуске через ASGI
+# ROOT_URLCONF указывает на асинхронные представления, которые нельзя
+# вызвать из синхронного кода
+SYNC_URLCONF = 'foodgram.urls'
+
+
+def create_unique(model, **fields):
+    """Создаёт объект одним INSERT в точке сохранения.
+
+    Возвращает None, если такая запись уже существует: проверка
+    выполняется уникальным ограничением, а не отдельным запросом,
+    поэтому параллельные запросы не приводят к ошибке 500. Если
+    связанный объект удалён параллельным запросом, возвращается 404;
+    остальные ошибки целостности не перехватываются.
+    """
+    try:
+        with transaction.atomic():
+            return model.objects.create(**fields)
+    except IntegrityError:
+        if model.objects.filter(**fields).exists():
+            return None
+        for value in fields.values():
+            if (isinstance(value, models.Model) and not type(
+                value
+            ).objects.filter(pk=value.pk).exists()):
+                raise Http404
+        raise
 
 
 class UserViewSet(UserDjoserViewSet):
@@ -63,12 +105,22 @@ class UserViewSet(UserDjoserViewSet):
         """Метод подписки на автора"""
         author = get_object_or_404(User, pk=id)
         if request.method == 'POST':
-            data = {'user': request.user.id, 'author': author.id}
-            serializer = SubscriptionSerializer(
-                data=data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            if author == request.user:
+                return Response(
+                    {'non_field_errors': [
+                        'Нельзя подписаться на самого себя'
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if create_unique(
+                Subscription, user=request.user, author=author
+            ) is None:
+                return Response(
+                    {'non_field_errors': [
+                        'Вы уже подписаны на этого автора'
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 SubscribeSerializer(
                     author,
@@ -77,29 +129,41 @@ class UserViewSet(UserDjoserViewSet):
                 status=status.HTTP_201_CREATED
             )
 
-        subscription = Subscription.objects.filter(user=request.user,
-                                                   author=author).first()
-
-        if subscription is None:
+        deleted, _ = Subscription.objects.filter(
+            user=request.user, author=author
+        ).delete()
+        if not deleted:
             return Response({'detail': 'Подписки не существует'},
                             status=status.HTTP_400_BAD_REQUEST)
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
         methods=['get'],
         url_path='subscriptions',
+        permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        """Метод просмотра подписок пользователя"""
-        user = request.user
-        subscription_queryset = user.subscriber.all().select_related('author')
-        pages = self.paginate_queryset(subscription_queryset)
-        authors_data = [subscription_queryset.author for subscription_queryset
-                        in pages]
+        """Метод просмотра подписок пользователя.
+
+        Авторы страницы загружаются вместе с числом их рецептов,
+        а последние recipes_limit рецептов каждого автора — одним
+        запросом с оконной функцией.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
+        authors = User.objects.filter(
+            subscription__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
+        pages = self.paginate_queryset(authors)
         serializer = SubscribeSerializer(
-            authors_data,
+            pages,
             many=True,
             context={'request': request}
         )
@@ -145,14 +209,42 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Метод поиска ингредиентов по началу названия.
+
+        Поиск выполняется по индексу в памяти процесса без обращения
+        к базе данных.
+        """
+        name = request.query_params.get('name')
+        if name is None:
+            return self.catalogue(request)
+        return Response(ingredient_index.search(name))
+
+    def catalogue(self, request):
+        """Метод получения полного списка ингредиентов."""
+        return ingredient_catalogue.get_response(request)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для работы с рецептами."""
     queryset = Recipe.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    shopping_list_streams = {
+        'txt': (iter_shopping_list_txt, 'text/plain; charset=utf-8'),
+        'csv': (iter_shopping_list_csv, 'text/csv; charset=utf-8'),
+    }
+
+    def get_queryset(self):
+        """Метод получения рецептов с автором, ингредиентами и флагами
+        избранного и списка покупок."""
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        return queryset.with_related(user).with_user_flags(user)
 
     def get_serializer_class(self):
         """Метод выбора сериализатора в зависимости от действий"""
@@ -160,6 +252,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        """Метод получения списка рецептов с кэшированием ответа"""
+        return self.get_cached_response(
+            request, super().list, None, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Метод получения рецепта с кэшированием ответа"""
+        return self.get_cached_response(
+            request, super().retrieve, kwargs[self.lookup_field],
+            *args, **kwargs
+        )
+
+    def get_cached_response(self, request, view, recipe_id, *args,
+                            **kwargs):
+        """Общий метод получения ответа из кэша рецептов.
+
+        При промахе ответ строится обычным образом и сохраняется
+        в кэше без флагов пользователя.
+        """
+        if not recipe_response_cache.is_cacheable(request):
+            return view(request, *args, **kwargs)
+        key = recipe_response_cache.get_key(request, recipe_id)
+        data = recipe_response_cache.get(request, key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            recipe_response_cache.set(key, response.data)
+        return response
+
     @action(detail=True, methods=['get'], url_path='get-link',
             permission_classes=[AllowAny])
     def get_link(self, request, pk=None):
@@ -176,30 +299,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         """Метод добавления и удаления рецепта из избранного"""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-
         if request.method == 'POST':
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {'errors': 'Рецепт уже добавлен в избранное'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite = Favorite.objects.create(user=user, recipe=recipe)
-            serializer = FavoriteSerializer(
-                favorite, context={'request': request}
+            return self.add_relation(
+                request, pk, FavoriteSerializer,
+                'Рецепт уже добавлен в избранное'
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if request.method == 'DELETE':
-            favorite = Favorite.objects.filter(user=user, recipe=recipe)
-            if not favorite.exists():
-                return Response(
-                    {'errors': 'Рецепт не найден в избранном'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_relation(
+            request, pk, Favorite, 'Рецепт не найден в избранном'
+        )
 
     @action(
         detail=True,
@@ -208,79 +315,259 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         """Метод добавления и удаления рецепта из списка покупок"""
-        user = request.user
+        if request.method == 'POST':
+            return self.add_relation(
+                request, pk, ShoppingCartSerializer,
+                'Рецепт уже добавлен в список покупок'
+            )
+        return self.remove_relation(
+            request, pk, ShoppingCart, 'Рецепт не найден в списке покупок'
+        )
+
+    def add_relation(self, request, pk, serializer_class, error):
+        """Общий метод добавления рецепта в избранное или список
+        покупок одним INSERT.
+
+        Повторное добавление, в том числе из параллельных запросов,
+        отсекается уникальным ограничением базы данных.
+        """
         recipe = get_object_or_404(Recipe, pk=pk)
+        model = serializer_class.Meta.model
+        instance = create_unique(model, user=request.user, recipe=recipe)
+        if instance is None:
+            return Response(
+                {'errors': error}, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = serializer_class(
+            instance, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {'errors': 'Рецепт уже добавлен в список покупок'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart = ShoppingCart.objects.create(user=user, recipe=recipe)
-            serializer = ShoppingCartSerializer(
-                cart, context={'request': request}
+    def remove_relation(self, request, pk, model, error):
+        """Общий метод удаления рецепта из избранного или списка
+        покупок.
+
+        Удаление выполняется одним DELETE ... RETURNING, и зависящие
+        данные обновляются, только если строку удалил этот запрос:
+        проигравший параллельный запрос ничего не вычитает.
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        with transaction.atomic():
+            deleted = model.objects.delete_recipes(
+                request.user, [recipe.pk]
+            )
+            if deleted:
+                self.apply_bulk_changes(model, request.user, deleted, -1)
+        if not deleted:
+            return Response(
+                {'errors': error}, status=status.HTTP_400_BAD_REQUEST
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        if request.method == 'DELETE':
-            cart = ShoppingCart.objects.filter(user=user, recipe=recipe)
-            if not cart.exists():
-                return Response(
-                    {'errors': 'Рецепт не найден в списке покупок'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    def bulk_update_relations(self, request, model):
+        """Общий метод массового добавления и удаления рецептов
+        в избранное или список покупок.
+
+        Добавление выполняется одним INSERT ... ON CONFLICT DO NOTHING,
+        удаление — одним DELETE; оба возвращают id изменённых строк.
+        Счётчики и суммарный список покупок обновляются отдельными
+        запросами только для этих рецептов, поэтому параллельное
+        добавление или удаление тех же рецептов не учитывается дважды.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        user = request.user
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=ids).values_list(
+                'pk', flat=True
+            ))
+            if request.method == 'POST':
+                changed = model.objects.insert_recipes(user, found)
+                sign, statuses = 1, ('added', 'exists')
+            else:
+                changed = model.objects.delete_recipes(user, found)
+                sign, statuses = -1, ('removed', 'missing')
+            if changed:
+                self.apply_bulk_changes(model, user, changed, sign)
+        results = []
+        for pk in ids:
+            if pk not in found:
+                result = 'not_found'
+            else:
+                result = statuses[0] if pk in changed else statuses[1]
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def apply_bulk_changes(self, model, user, recipe_ids, sign):
+        """Обновляет данные, зависящие от избранного и списка покупок."""
+        if model is Favorite:
+            recipes = Recipe.objects.filter(pk__in=recipe_ids)
+            if sign < 0:
+                recipes = recipes.filter(favorites_count__gt=0)
+            recipes.update(favorites_count=F('favorites_count') + sign)
+        else:
+            ShoppingListItem.objects.add_recipes(user, recipe_ids, sign)
+            shopping_list_pdf_cache.invalidate_user(user.id)
+        bump_version(model._meta.db_table)
 
     @action(
         detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite/bulk',
         permission_classes=[IsAuthenticated]
     )
-    def download_shopping_cart(self, request):
-        """Метод скачивания списка покупок PDF"""
-        user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_cart__user=user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            amount=Sum('amount')
+    def favorite_bulk(self, request):
+        """Метод массового добавления и удаления рецептов
+        из избранного"""
+        return self.bulk_update_relations(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        """Метод массового добавления и удаления рецептов
+        из списка покупок"""
+        return self.bulk_update_relations(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        """Метод просмотра суммарного списка покупок"""
+        items = request.user.shopping_list.select_related(
+            'ingredient'
         ).order_by('ingredient__name')
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.pdf"'
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PDFRenderer, PlainTextRenderer, CSVRenderer, FastJSONRenderer
+        ]
+    )
+    def download_shopping_cart(self, request):
+        """Метод скачивания списка покупок.
+
+        Формат выбирается параметром format: pdf (по умолчанию),
+        txt или csv. Текстовые форматы отдаются потоком.
+        """
+        file_format = request.accepted_renderer.format
+        if file_format in self.shopping_list_streams:
+            iter_shopping_list, content_type = (
+                self.shopping_list_streams[file_format]
+            )
+            response = StreamingHttpResponse(
+                iter_shopping_list(request.user), content_type=content_type
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{file_format}"'
+            )
+            return response
+        return FileResponse(
+            shopping_list_pdf_cache.get_pdf(request.user),
+            as_attachment=True,
+            filename='shopping_list.pdf',
+            content_type='application/pdf'
         )
 
-        # Создание PDF документа
-        p = canvas.Canvas(response)
-
-        # Регистрация шрифта для поддержки кириллицы
-        pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        p.setFont('DejaVuSans', FontConst.SIZE_FONT_REG)
-
-        # Заголовок документа
-        p.drawString(FontConst.SET_FONT_X_TITLE, FontConst.SET_FONT_Y_TITLE,
-                     'Список покупок')
-        p.setFont('DejaVuSans', FontConst.SIZE_FONT)
-        # Отступы
-        y_position = FontConst.Y_POSITION
-        # Добавление ингредиентов в PDF
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['amount']
-            p.drawString(
-                FontConst.X_POSITION, y_position,
-                f"{name} — {amount} {measurement_unit}"
+
+class BatchView(APIView):
+    """Представление для выполнения пакета запросов к API.
+
+    Запросы выполняются последовательно за один HTTP-запрос от имени
+    уже аутентифицированного пользователя. При atomic=true пакет
+    выполняется в одной транзакции, которая откатывается при первой
+    ошибке.
+    """
+    permission_classes = (AllowAny,)
+    skipped_status = status.HTTP_424_FAILED_DEPENDENCY
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+        if not serializer.validated_data['atomic']:
+            results = [self.perform_item(request, item) for item in items]
+            return Response({'results': results})
+        results = []
+        with transaction.atomic():
+            for item in items:
+                result = self.perform_item(request, item)
+                results.append(result)
+                if result['status'] >= status.HTTP_400_BAD_REQUEST:
+                    transaction.set_rollback(True)
+                    break
+        results += [
+            {'status': self.skipped_status, 'body': None}
+            for _ in items[len(results):]
+        ]
+        return Response({'results': results})
+
+    def build_request(self, request, item):
+        """Создаёт запрос Django для элемента пакета."""
+        path, _, query_string = item['path'].partition('?')
+        body = b''
+        if 'body' in item:
+            body = json.dumps(item['body']).encode()
+        environ = {
+            key: value for key, value in request.META.items()
+            if key not in ('wsgi.input', 'CONTENT_TYPE', 'CONTENT_LENGTH')
+        }
+        environ.update({
+            'REQUEST_METHOD': item['method'],
+            # WSGI передаёт путь и параметры как байты в latin-1
+            'PATH_INFO': path.encode().decode('iso-8859-1'),
+            'QUERY_STRING': query_string.encode().decode('iso-8859-1'),
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.url_scheme': request.scheme,
+        })
+        sub_request = WSGIRequest(environ)
+        if request.user.is_authenticated:
+            # Пользователь уже аутентифицирован внешним запросом
+            sub_request._force_auth_user = request.user
+            sub_request._force_auth_token = request.auth
+        return sub_request
+
+    def perform_item(self, request, item):
+        """Выполняет элемент пакета и возвращает его статус и тело."""
+        path = item['path'].partition('?')[0]
+        try:
+            match = resolve(path, urlconf=SYNC_URLCONF)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': None}
+        if getattr(match.func, 'view_class', None) is type(self):
+            return {
+                'status': status.HTTP_400_BAD_REQUEST,
+                'body': {'detail': 'Вложенные пакеты не поддерживаются'}
+            }
+        try:
+            response = match.func(
+                self.build_request(request, item),
+                *match.args, **match.kwargs
             )
-            y_position -= FontConst.Y_POSITION_UPDATE
-            # Проверка, нужна ли новая страница
-            if y_position <= FontConst.NEW_PAGE_CHECK:
-                p.showPage()
-                p.setFont('DejaVuSans', FontConst.SIZE_FONT)
-                y_position = FontConst.SET_FONT_Y_TITLE
-        p.showPage()
-        p.save()
-        return response
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            return {
+                'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'body': None
+            }
+        content_type = response.get('Content-Type', '')
+        if response.streaming or not response.content:
+            body = None
+        elif content_type.startswith('application/json'):
+            body = json.loads(response.content)
+        elif content_type.startswith('text/'):
+            body = response.content.decode(response.charset)
+        else:
+            body = None
+        return {'status': response.status_code, 'body': body}
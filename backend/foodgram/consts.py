@@ -1,6 +1,8 @@
 class MyConsts():
     MIN_VALUE_VALIDATOR = 1
     MAX_VALUE_VALIDATOR = 32000
+    MAX_BULK_RECIPES = 100
+    MAX_BATCH_REQUESTS = 20
 
 
 class FontConst():
@@ -12,3 +14,14 @@ class FontConst():
     X_POSITION = 50
     Y_POSITION_UPDATE = 25
     NEW_PAGE_CHECK = 50
+
+
+class ImageConst():
+    VARIANT_SIZES = {
+        'thumbnail': (320, 320),
+        'card': (640, 640),
+        'detail': (1280, 1280),
+    }
+    VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+    VARIANT_QUALITY = 80
+    VARIANTS_DIR = 'recipes/images/variants/'
@@ -0,0 +1,17 @@
+"""URLconf для запуска через ASGI.
+
+Часто читаемые адреса API обслуживаются асинхронными
+представлениями, остальные — теми же представлениями, что и при
+запуске через WSGI.
+"""
+from django.urls import path
+
+from api import async_views
+from foodgram.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/ingredients/', async_views.ingredient_list),
+    path('api/recipes/', async_views.recipe_list),
+    path('api/recipes/<int:pk>/', async_views.recipe_detail),
+    path('api/users/', async_views.user_list),
+] + sync_urlpatterns
@@ -0,0 +1,49 @@
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+
+# Признак конца итератора
+END = object()
+
+
+async def iterate_in_thread(iterator):
+    """Отдаёт части синхронного итератора, получая каждую
+    в отдельном потоке."""
+    iterator = iter(iterator)
+    while True:
+        chunk = await sync_to_async(next)(iterator, END)
+        if chunk is END:
+            return
+        yield chunk
+
+
+class AsyncStreamingMiddleware:
+    """Отдаёт потоковые ответы синхронных представлений по частям
+    при запуске через ASGI.
+
+    Django 4.2 под ASGI собирает синхронный итератор потокового
+    ответа в список целиком, прежде чем отправить первый байт.
+    Middleware заменяет такой итератор асинхронным, поэтому ответ
+    уходит клиенту по мере формирования. Под WSGI запрос передаётся
+    дальше без изменений.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = iterate_in_thread(
+                response.streaming_content
+            )
+        return response
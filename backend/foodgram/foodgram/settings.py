@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.AsyncStreamingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -46,7 +47,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+# Режим запуска: wsgi или asgi. В режиме asgi часто читаемые адреса
+# API обслуживаются асинхронными представлениями (api.async_views):
+# поиск ингредиентов и список пользователей — всегда, список рецептов
+# и рецепт — только при попадании в кэш ответов. Промахи кэша,
+# запись и остальные адреса выполняются синхронными представлениями
+# DRF в пуле потоков через sync_to_async, поэтому без пользы от кэша
+# ответов режим asgi выигрыша не даёт. Режимы можно сравнить командой
+# load_test, в том числе с медленными клиентами (--slow-clients)
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+
+ROOT_URLCONF = (
+    'foodgram.asgi_urls' if SERVER_MODE == 'asgi' else 'foodgram.urls'
+)
 
 TEMPLATES = [
     {
@@ -76,7 +89,10 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Файл тестовой базы SQLite; по умолчанию база в памяти,
+        # на которой тесты параллельных запросов пропускаются
+        'TEST': {'NAME': os.getenv('DB_TEST_NAME')},
     }
 }
 
@@ -120,6 +136,25 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Изображения больше IMAGE_UPLOAD_MAX_SIZE отклоняются до декодирования,
+# а загружаемые файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE сохраняются
+# во временный файл, а не в память
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', default=10 * 1024 * 1024)
+)
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', default=256 * 1024)
+)
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'foodgram.storage.ContentHashStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -134,13 +169,57 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
     'PAGE_SIZE': 6,
     'DATETIME_FORMAT': '%d.%m.%Y %H:%M',
 }
 
+# Pagination counts
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=30)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', default=100000)
+)
+
+# Ingredient index
+# Как часто индекс ингредиентов сверяет версию в кэше Django и как
+# долго он может жить без перестроения из базы, в секундах. Проверка
+# версии не обращается к базе данных. Если CACHES не общий для всех
+# процессов, изменения ингредиентов из других процессов становятся
+# видны только через INGREDIENT_INDEX_TIMEOUT
+INGREDIENT_INDEX_CHECK_INTERVAL = int(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', default=5)
+)
+INGREDIENT_INDEX_TIMEOUT = int(
+    os.getenv('INGREDIENT_INDEX_TIMEOUT', default=300)
+)
+
+# Token authentication cache
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=60))
+
+# Recipe response cache
+# По умолчанию ответы хранятся в LRU-кэше процесса, а версии данных —
+# в кэше Django. Если CACHES не общий для всех процессов, устаревание
+# ответов в других процессах ограничено RECIPE_CACHE_TIMEOUT.
+RECIPE_CACHE_BACKEND = os.getenv(
+    'RECIPE_CACHE_BACKEND', default='api.cache.LRUCache'
+)
+RECIPE_CACHE_SIZE = int(os.getenv('RECIPE_CACHE_SIZE', default=1000))
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60))
+
 # DJOSER settings
 DJOSER = {
     'LOGIN_FIELD': 'email',
@@ -156,3 +235,17 @@ DJOSER = {
     },
     'HIDE_USERS': False,
 }
+
+# Shopping list PDF cache
+SHOPPING_LIST_PDF_CACHE_SIZE = int(
+    os.getenv('SHOPPING_LIST_PDF_CACHE_SIZE', default=32 * 1024 * 1024)
+)
+SHOPPING_LIST_PDF_CACHE_USERS = int(
+    os.getenv('SHOPPING_LIST_PDF_CACHE_USERS', default=10000)
+)
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_PDF_CACHE_TIMEOUT', default=60)
+)
+SHOPPING_LIST_PDF_SPOOL_SIZE = int(
+    os.getenv('SHOPPING_LIST_PDF_SPOOL_SIZE', default=1024 * 1024)
+)
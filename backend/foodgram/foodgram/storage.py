@@ -0,0 +1,62 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# Размер блока при вычислении хеша содержимого файла
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Файловое хранилище, именующее файлы по хешу содержимого.
+
+    Одинаковые файлы хранятся один раз, а содержимое файла по имени
+    никогда не меняется, поэтому ссылки на него можно кэшировать
+    бессрочно. Файл может использоваться несколькими объектами,
+    поэтому delete() ничего не удаляет: неиспользуемые файлы удаляет
+    команда collect_media_garbage.
+    """
+
+    def get_content_name(self, name, content):
+        """Возвращает имя файла по хешу его содержимого с сохранением
+        каталога и расширения исходного имени."""
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        """Сохраняет файл, если файла с таким содержимым ещё нет.
+
+        У уже существующего файла обновляется время изменения:
+        collect_media_garbage не удаляет недавно изменённые файлы,
+        поэтому повторно использованный неиспользуемый файл не будет
+        удалён, пока ссылка на него ещё не сохранена в базе.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length=max_length)
+
+    def delete(self, name):
+        """Не удаляет файл: он может использоваться другими
+        объектами."""
+
+    def purge(self, name):
+        """Удаляет файл из хранилища."""
+        super().delete(name)
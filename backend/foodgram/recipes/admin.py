@@ -27,7 +27,7 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description='В избранном')
     def get_favorite_count(self, obj):
         """Получает число добавлений рецепта в избранное."""
-        return obj.in_favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Изображение')
     def get_image(self, obj):
@@ -0,0 +1,96 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from consts import ImageConst
+
+# Ключ, под которым в image_variants хранится имя исходного файла
+SOURCE_KEY = 'source'
+
+
+def is_outdated(recipe):
+    """Проверяет, что варианты изображения построены не по текущему
+    файлу рецепта."""
+    return recipe.image_variants.get(SOURCE_KEY) != recipe.image.name
+
+
+def to_rgb(image):
+    """Приводит изображение к RGB, накладывая прозрачные области
+    на белый фон."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(image_field):
+    """Строит уменьшенные копии изображения в форматах WebP и JPEG.
+
+    Возвращает словарь вида {размер: {формат: имя файла}} вместе
+    с именем исходного файла. Если изображение не читается,
+    возвращает пустой словарь.
+    """
+    try:
+        with image_field.open('rb') as source:
+            original = to_rgb(ImageOps.exif_transpose(Image.open(source)))
+    except OSError:
+        return {}
+    storage = image_field.storage
+    stem = os.path.splitext(os.path.basename(image_field.name))[0]
+    variants = {SOURCE_KEY: image_field.name}
+    for size, box in ImageConst.VARIANT_SIZES.items():
+        image = original.copy()
+        image.thumbnail(box, Image.LANCZOS)
+        variants[size] = {}
+        for extension, image_format in ImageConst.VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            image.save(
+                buffer, image_format,
+                quality=ImageConst.VARIANT_QUALITY, optimize=True
+            )
+            variants[size][extension] = storage.save(
+                f'{ImageConst.VARIANTS_DIR}{stem}_{size}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(variants, storage):
+    """Удаляет файлы вариантов изображения."""
+    for size in ImageConst.VARIANT_SIZES:
+        for name in variants.get(size, {}).values():
+            storage.delete(name)
+
+
+def get_variant_urls(recipe, request=None):
+    """Возвращает ссылки на варианты изображения рецепта."""
+    storage = recipe.image.storage
+    urls = {}
+    for size in ImageConst.VARIANT_SIZES:
+        names = recipe.image_variants.get(size)
+        if not names:
+            continue
+        urls[size] = {}
+        for extension, name in names.items():
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size][extension] = url
+    return urls
+
+
+def refresh_variants(recipe):
+    """Перестраивает варианты изображения рецепта, если изображение
+    изменилось, и сохраняет их без повторной отправки сигналов."""
+    if not recipe.image or not is_outdated(recipe):
+        return
+    old_variants = recipe.image_variants
+    recipe.image_variants = generate_variants(recipe.image)
+    type(recipe).objects.filter(pk=recipe.pk).update(
+        image_variants=recipe.image_variants
+    )
+    delete_variants(old_variants, recipe.image.storage)
@@ -0,0 +1,108 @@
+from bisect import bisect_left
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Символ, который больше любого символа в названии ингредиента
+MAX_CHAR = chr(0x10FFFF)
+# Версия таблицы ингредиентов в кэше Django; меняется на случайное
+# значение при каждом изменении
+VERSION_KEY = 'ingredient-index-version'
+
+IndexContent = namedtuple('IndexContent', ('keys', 'items', 'version'))
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов для поиска по префиксу.
+
+    Индекс хранится в памяти процесса и строится при первом
+    обращении; поиск не обращается к базе данных. Не чаще раза
+    в INGREDIENT_INDEX_CHECK_INTERVAL секунд индекс сверяет версию
+    в кэше Django, которую меняет invalidate(), и перестраивается,
+    если она изменилась, а также не реже раза
+    в INGREDIENT_INDEX_TIMEOUT секунд.
+
+    Если CACHES общий для всех процессов, изменения ингредиентов
+    через модели и импорт доходят до всех процессов за интервал
+    проверки. Иначе, как и изменения в обход моделей, они доходят
+    до других процессов только при перестроении по истечении
+    INGREDIENT_INDEX_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._content = None
+        self._shared_version = None
+        self._built_at = float('-inf')
+        self._checked_at = float('-inf')
+
+    def _build(self, version):
+        """Загружает ингредиенты из базы и строит индекс."""
+        from .models import Ingredient
+
+        rows = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+        rows = sorted(rows, key=lambda row: (row[1].casefold(), row[1]))
+        keys = [name.casefold() for _, name, _ in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for pk, name, measurement_unit in rows
+        ]
+        return IndexContent(keys, items, version)
+
+    def _get(self):
+        """Возвращает актуальный индекс, при необходимости построив
+        его заново."""
+        content = self._content
+        now = monotonic()
+        if (content is not None and now - self._checked_at
+                < settings.INGREDIENT_INDEX_CHECK_INTERVAL):
+            return content
+        with self._lock:
+            content = self._content
+            if (content is not None and now - self._checked_at
+                    < settings.INGREDIENT_INDEX_CHECK_INTERVAL):
+                return content
+            shared_version = cache.get(VERSION_KEY)
+            if (content is None or shared_version != self._shared_version
+                    or now - self._built_at
+                    >= settings.INGREDIENT_INDEX_TIMEOUT):
+                version = content.version + 1 if content else 1
+                content = self._content = self._build(version)
+                self._shared_version = shared_version
+                self._built_at = now
+            self._checked_at = now
+        return content
+
+    @property
+    def version(self):
+        """Номер текущей сборки индекса."""
+        return self._get().version
+
+    def search(self, prefix):
+        """Возвращает ингредиенты, название которых начинается
+        с prefix без учёта регистра."""
+        keys, items, _ = self._get()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, start)
+        return items[start:end]
+
+    def all(self):
+        """Возвращает все ингредиенты в порядке индекса."""
+        return self._get().items
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах: в этом процессе
+        сразу, в остальных — при следующей проверке версии."""
+        cache.set(VERSION_KEY, uuid4().hex, None)
+        with self._lock:
+            self._checked_at = float('-inf')
+
+
+ingredient_index = IngredientIndex()
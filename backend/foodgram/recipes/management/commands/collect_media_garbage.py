@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from consts import ImageConst
+from recipes.models import Recipe
+from users.models import User
+
+
+def iter_files(storage, directory):
+    """Рекурсивно перечисляет файлы каталога хранилища."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}{name}'
+    for name in directories:
+        yield from iter_files(storage, f'{directory}{name}/')
+
+
+class Command(BaseCommand):
+    """Команда для удаления файлов медиа, на которые не ссылаются
+    рецепты и пользователи."""
+    help = (
+        'Удаляет изображения рецептов, их уменьшенные копии и аватары, '
+        'которые больше не используются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество неиспользуемых файлов'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help=(
+                'Не удалять файлы моложе указанного числа минут, '
+                'чтобы не задеть незавершённые загрузки'
+            )
+        )
+
+    def get_used_names(self):
+        """Возвращает имена файлов, на которые есть ссылки."""
+        used = set(User.objects.exclude(avatar='').values_list(
+            'avatar', flat=True
+        ))
+        for image, variants in Recipe.objects.values_list(
+            'image', 'image_variants'
+        ):
+            used.add(image)
+            for size in ImageConst.VARIANT_SIZES:
+                used.update(variants.get(size, {}).values())
+        return used
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        directories = (
+            Recipe._meta.get_field('image').upload_to,
+            User._meta.get_field('avatar').upload_to,
+        )
+        deadline = timezone.now() - timedelta(minutes=options['min_age'])
+        candidates = [
+            name
+            for directory in directories
+            for name in iter_files(storage, directory)
+            if storage.get_modified_time(name) < deadline
+        ]
+        # Ссылки собираются после просмотра файлов, чтобы в них попали
+        # все объекты, сохранённые до появления файла в списке
+        used = self.get_used_names()
+        orphans = [name for name in candidates if name not in used]
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.SUCCESS(f'Неиспользуемых файлов: {len(orphans)}')
+            )
+            return
+        purge = getattr(storage, 'purge', storage.delete)
+        purged = 0
+        for name in orphans:
+            # Файл, повторно загруженный после сбора ссылок, получил
+            # новое время изменения и не удаляется
+            if storage.get_modified_time(name) >= deadline:
+                continue
+            purge(name)
+            purged += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено неиспользуемых файлов: {purged}')
+        )
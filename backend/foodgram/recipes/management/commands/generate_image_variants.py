@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import SOURCE_KEY, refresh_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для построения уменьшенных копий изображений рецептов."""
+    help = (
+        'Строит уменьшенные копии изображений рецептов, для которых '
+        'они отсутствуют или устарели'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить копии для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        )
+        updated = 0
+        for recipe in recipes.iterator():
+            if options['force']:
+                recipe.image_variants.pop(SOURCE_KEY, None)
+            source = recipe.image_variants.get(SOURCE_KEY)
+            refresh_variants(recipe)
+            if recipe.image_variants.get(SOURCE_KEY) != source:
+                updated += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлено рецептов: {updated}')
+        )
@@ -3,6 +3,7 @@ import json
 import os
 from django.core.management.base import BaseCommand, CommandError
 
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
 
 
@@ -34,6 +35,10 @@ class Command(BaseCommand):
             raise CommandError(
                 f'Ошибка при импорте ингредиентов: {e}'
             )
+        # bulk_create не отправляет сигналы, поэтому индекс
+        # сбрасывается явно; веб-процессы заметят импорт по версии
+        # в общем кэше или при перестроении индекса по таймауту
+        ingredient_index.invalidate()
 
         self.stdout.write(
             self.style.SUCCESS('Ингредиенты успешно импортированы')
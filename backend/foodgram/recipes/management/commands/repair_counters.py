@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingListItem
+from users.models import User
+
+
+def count_subquery(queryset, field):
+    """Возвращает подзапрос с количеством строк queryset,
+    связанных с внешней записью через field."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта счётчиков избранного и рецептов
+    и суммарных списков покупок."""
+    help = 'Пересчитывает и исправляет расхождения в счётчиках'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shopping-lists',
+            action='store_true',
+            help='Также пересчитать суммарные списки покупок'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений'
+        )
+
+    def handle(self, *args, **options):
+        counters = (
+            (Recipe, 'favorites_count', Favorite.objects.all(), 'recipe'),
+            (User, 'recipes_count', Recipe.objects.all(), 'author'),
+        )
+        with transaction.atomic():
+            for model, counter, queryset, field in counters:
+                actual = count_subquery(queryset, field)
+                drifted = model.objects.annotate(actual=actual).exclude(
+                    **{counter: F('actual')}
+                )
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = model.objects.filter(
+                        pk__in=drifted.values('pk')
+                    ).update(**{counter: actual})
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}.{counter}: '
+                    f'расхождений {fixed}'
+                )
+            if options['shopping_lists'] and not options['dry_run']:
+                ShoppingListItem.objects.rebuild()
+                self.stdout.write('Списки покупок пересчитаны')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены'))
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-17 05:53
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+# Индекс для поиска по префиксу без учёта регистра использует класс
+# операторов PostgreSQL, поэтому создаётся только в PostgreSQL
+INGREDIENT_NAME_IPREFIX_INDEX = models.Index(
+    django.contrib.postgres.indexes.OpClass(
+        django.db.models.functions.text.Upper('name'),
+        name='text_pattern_ops'
+    ),
+    name='ingredient_name_iprefix_idx'
+)
+
+
+def add_ingredient_name_iprefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(
+        apps.get_model('recipes', 'Ingredient'),
+        INGREDIENT_NAME_IPREFIX_INDEX
+    )
+
+
+def remove_ingredient_name_iprefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(
+        apps.get_model('recipes', 'Ingredient'),
+        INGREDIENT_NAME_IPREFIX_INDEX
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(
+            add_ingredient_name_iprefix_index,
+            remove_ingredient_name_iprefix_index
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['recipe'], include=('ingredient', 'amount'), name='recipe_ingredient_cover_idx'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connection, models
 
-from users.models import User
+from users.models import CountersMixin, Subscription, User
 from consts import MyConsts
 
 
@@ -20,6 +20,16 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        indexes = [
+            models.Index(
+                fields=['name'],
+                name='ingredient_name_prefix_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
+        # Индекс ingredient_name_iprefix_idx по UPPER(name) с классом
+        # операторов text_pattern_ops создаётся миграцией 0003 только
+        # в PostgreSQL и поэтому не описан в модели
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'measurement_unit'],
@@ -31,7 +41,60 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с планами загрузки для чтения."""
+
+    def with_related(self, user=None):
+        """Загружает автора и ингредиенты рецептов фиксированным
+        числом запросов.
+
+        Для авторизованного пользователя авторы загружаются отдельным
+        запросом с аннотацией is_subscribed, для анонимного —
+        присоединяются к основному запросу.
+        """
+        queryset = self.prefetch_related(
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        if user is None or not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=models.Exists(
+                        Subscription.objects.filter(
+                            user=user, author=models.OuterRef('pk')
+                        )
+                    )
+                )
+            )
+        )
+
+    def with_user_flags(self, user=None):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart."""
+        if user is None or not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False)
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            )
+        )
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
         User,
@@ -64,16 +127,60 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
+
+    counter_fields = ('favorites_count',)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeIngredientManager(models.Manager):
+    """Менеджер ингредиентов рецептов."""
+
+    def delete_ingredients(self, recipe_id, ingredient_ids):
+        """Удаляет ингредиенты рецепта одним DELETE ... RETURNING
+        и возвращает количества удалённых ингредиентов по их id.
+
+        Сигналы не отправляются.
+        """
+        if not ingredient_ids:
+            return {}
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(ingredient_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE recipe_id = %s '
+                f'AND ingredient_id IN ({placeholders}) '
+                f'RETURNING ingredient_id, amount',
+                [recipe_id, *ingredient_ids]
+            )
+            return dict(cursor.fetchall())
+
+
 class RecipeIngredient(models.Model):
     """Модель, связывающая рецепт и ингредиент."""
     recipe = models.ForeignKey(
@@ -93,9 +200,18 @@ class RecipeIngredient(models.Model):
         verbose_name='Количество'
     )
 
+    objects = RecipeIngredientManager()
+
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
+        indexes = [
+            models.Index(
+                fields=['recipe'],
+                include=['ingredient', 'amount'],
+                name='recipe_ingredient_cover_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['recipe', 'ingredient'],
@@ -109,6 +225,53 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.measurement_unit}')
 
 
+class UserRecipeManager(models.Manager):
+    """Менеджер связей пользователя с рецептами: избранного и списка
+    покупок.
+
+    Массовые добавление и удаление выполняются одним запросом
+    с RETURNING и возвращают id рецептов, строки которых изменил
+    именно этот запрос. Строки, добавленные или удалённые
+    параллельным запросом, в результат не попадают. Сигналы при этом
+    не отправляются.
+    """
+
+    def insert_recipes(self, user, recipe_ids):
+        """Добавляет рецепты пользователю, пропуская уже добавленные,
+        и возвращает id добавленных рецептов."""
+        if not recipe_ids:
+            return set()
+        table = self.model._meta.db_table
+        values = ', '.join(['(%s, %s)'] * len(recipe_ids))
+        params = [
+            value for recipe_id in sorted(recipe_ids)
+            for value in (user.pk, recipe_id)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) '
+                f'VALUES {values} ON CONFLICT (user_id, recipe_id) '
+                f'DO NOTHING RETURNING recipe_id',
+                params
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+    def delete_recipes(self, user, recipe_ids):
+        """Удаляет рецепты пользователя и возвращает id удалённых
+        рецептов."""
+        if not recipe_ids:
+            return set()
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s '
+                f'AND recipe_id IN ({placeholders}) RETURNING recipe_id',
+                [user.pk, *recipe_ids]
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
 class Favorite(models.Model):
     """Модель избранных рецептов."""
     user = models.ForeignKey(
@@ -124,6 +287,8 @@ class Favorite(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -153,6 +318,8 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -165,3 +332,156 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в список покупок'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Менеджер суммарного списка покупок.
+
+    Количества изменяются одним запросом INSERT ... ON CONFLICT
+    DO UPDATE, прибавляющим разницу к уже сохранённой сумме.
+    """
+
+    def _upsert(self, queryset, columns=('user_id', 'ingredient_id')):
+        """Прибавляет к списку покупок строки queryset, содержащие
+        columns и количество."""
+        table = self.model._meta.db_table
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}, amount) '
+                f'{sql} ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + excluded.amount',
+                params
+            )
+
+    def add_recipes(self, user, recipe_ids, sign=1):
+        """Добавляет ингредиенты рецептов в список покупок
+        пользователя, при sign=-1 — вычитает их."""
+        self._upsert(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by().values('ingredient_id').annotate(
+                user_id=models.Value(user.pk),
+                total=models.Sum('amount') * sign
+            ),
+            columns=('ingredient_id', 'user_id')
+        )
+        if sign < 0:
+            self.filter(user=user, amount__lte=0).delete()
+
+    def apply_recipe(self, recipe, sign=1):
+        """Добавляет ингредиенты рецепта в списки покупок всех
+        пользователей, у которых он в корзине, при sign=-1 —
+        вычитает их."""
+        self._upsert(
+            RecipeIngredient.objects.filter(
+                recipe=recipe, recipe__in_shopping_cart__isnull=False
+            ).order_by().values_list(
+                'recipe__in_shopping_cart__user_id', 'ingredient_id'
+            ).annotate(total=models.Sum('amount') * sign)
+        )
+        self.filter(
+            user__shopping_cart__recipe=recipe, amount__lte=0
+        ).delete()
+
+    def apply_ingredient(self, recipe_id, ingredient_id, amount):
+        """Прибавляет amount ингредиента рецепта к спискам покупок
+        всех пользователей, у которых рецепт в корзине."""
+        self._upsert(
+            ShoppingCart.objects.filter(recipe_id=recipe_id).values(
+                'user_id'
+            ).annotate(
+                ingredient=models.Value(ingredient_id),
+                total=models.Value(amount)
+            )
+        )
+        if amount < 0:
+            self.filter(
+                user__shopping_cart__recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount__lte=0
+            ).delete()
+
+    def apply_ingredients(self, recipe_id, amounts):
+        """Прибавляет количества ингредиентов рецепта из словаря
+        {id ингредиента: количество} к спискам покупок всех
+        пользователей, у которых рецепт в корзине.
+
+        Все изменения записываются одним INSERT ... SELECT
+        ... ON CONFLICT, обнулившиеся строки удаляются одним DELETE.
+        """
+        if not amounts:
+            return
+        table = self.model._meta.db_table
+        cart_table = ShoppingCart._meta.db_table
+        values = ', '.join(['(%s, %s)'] * len(amounts))
+        params = [
+            value for ingredient_id, amount in sorted(amounts.items())
+            for value in (ingredient_id, amount)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH deltas (ingredient_id, amount) AS (VALUES {values}) '
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, deltas.ingredient_id, deltas.amount '
+                f'FROM {cart_table} cart CROSS JOIN deltas '
+                f'WHERE cart.recipe_id = %s '
+                f'ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + excluded.amount',
+                [*params, recipe_id]
+            )
+        decreased = [
+            ingredient_id for ingredient_id, amount in amounts.items()
+            if amount < 0
+        ]
+        if decreased:
+            self.filter(
+                user__shopping_cart__recipe_id=recipe_id,
+                ingredient_id__in=decreased,
+                amount__lte=0
+            ).delete()
+
+    def rebuild(self):
+        """Пересчитывает списки покупок всех пользователей заново."""
+        self.all().delete()
+        self._upsert(
+            RecipeIngredient.objects.filter(
+                recipe__in_shopping_cart__isnull=False
+            ).order_by().values_list(
+                'recipe__in_shopping_cart__user_id', 'ingredient_id'
+            ).annotate(total=models.Sum('amount'))
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Модель суммарного списка покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.user}: {self.ingredient.name} - {self.amount} '
+                f'{self.ingredient.measurement_unit}')
@@ -0,0 +1,140 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from users.models import User
+from .images import refresh_variants
+from .ingredient_index import ingredient_index
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem
+)
+
+
+def is_deleted_directly(origin, model):
+    """Проверяет, что удаление начато с объектов model, а не
+    каскадом от связанной модели."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else (
+        type(origin)
+    )
+    return issubclass(origin_model, model)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасывает индекс ингредиентов после фиксации изменения
+    ингредиента, чтобы индекс не перестроился по старым данным."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    """Увеличивает счётчик добавлений рецепта в избранное."""
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    """Уменьшает счётчик добавлений рецепта в избранное."""
+    Recipe.objects.filter(
+        pk=instance.recipe_id, favorites_count__gt=0
+    ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецептов автора."""
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(sender, instance, **kwargs):
+    """Перестраивает уменьшенные копии изображения рецепта
+    при изменении изображения."""
+    refresh_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счётчик рецептов автора."""
+    User.objects.filter(
+        pk=instance.author_id, recipes_count__gt=0
+    ).update(recipes_count=F('recipes_count') - 1)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remove_old_shopping_list_recipe(sender, instance, **kwargs):
+    """Вычитает из списка покупок прежний рецепт изменяемой
+    записи корзины."""
+    if instance.pk is None:
+        return
+    old = ShoppingCart.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        ShoppingListItem.objects.add_recipes(
+            old.user, [old.recipe_id], sign=-1
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_shopping_list_recipe(sender, instance, **kwargs):
+    """Добавляет ингредиенты рецепта в список покупок."""
+    ShoppingListItem.objects.add_recipes(instance.user, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_shopping_list_recipe(sender, instance, origin=None, **kwargs):
+    """Вычитает ингредиенты рецепта из списка покупок.
+
+    При каскадном удалении рецепта списки покупок исправляются
+    до удаления, а при удалении пользователя удаляются целиком.
+    """
+    if is_deleted_directly(origin, ShoppingCart):
+        ShoppingListItem.objects.add_recipes(
+            instance.user, [instance.recipe_id], sign=-1
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Вычитает ингредиенты удаляемого рецепта из всех списков
+    покупок."""
+    ShoppingListItem.objects.apply_recipe(instance, sign=-1)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remove_old_recipe_ingredient(sender, instance, **kwargs):
+    """Вычитает из списков покупок прежнее количество изменяемого
+    ингредиента рецепта."""
+    if instance.pk is None:
+        return
+    old = RecipeIngredient.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        ShoppingListItem.objects.apply_ingredient(
+            old.recipe_id, old.ingredient_id, -old.amount
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def add_recipe_ingredient(sender, instance, **kwargs):
+    """Добавляет ингредиент рецепта в списки покупок."""
+    ShoppingListItem.objects.apply_ingredient(
+        instance.recipe_id, instance.ingredient_id, instance.amount
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_recipe_ingredient(sender, instance, origin=None, **kwargs):
+    """Вычитает удалённый ингредиент рецепта из списков покупок."""
+    if is_deleted_directly(origin, RecipeIngredient):
+        ShoppingListItem.objects.apply_ingredient(
+            instance.recipe_id, instance.ingredient_id, -instance.amount
+        )
@@ -3,7 +3,31 @@ from django.core.validators import RegexValidator
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Исключает поля-счётчики из обычного сохранения модели.
+
+    Счётчики изменяются только запросами UPDATE с F(), поэтому
+    save() объекта, загруженного раньше такого изменения, не должен
+    записывать в них устаревшие значения. Поля-счётчики перечисляются
+    в counter_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель пользователя."""
     username_validator = RegexValidator(
         regex=r'^[\w.@+-]+$',
@@ -36,6 +60,13 @@ class User(AbstractUser):
         blank=True,
         verbose_name='Аватар'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+
+    counter_fields = ('recipes_count',)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']